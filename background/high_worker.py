@@ -8,6 +8,8 @@ from background.tasks import (
     add_punkt_by_user,
 )
 from payments.process import process_transaction
+from services.http_session import close_http_session, get_http_session
+from utils.leader import start_scheduler, stop_leader_election
 from background.base import redis_settings, _redis_pool, get_redis_background_pool
 
 
@@ -26,12 +28,15 @@ async def startup(ctx):
     if not _redis_pool:
         _redis_pool = await get_redis_background_pool()
 
-    scheduler.start()
+    await start_scheduler(scheduler)
     ctx["scheduler"] = scheduler
+    await get_http_session()
     print("Worker is starting up...")
 
 
 async def shutdown(ctx):
+    await stop_leader_election()
+    await close_http_session()
     print("Worker is shutting down...")
 
 
@@ -4,12 +4,23 @@ from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 
 
 from background.base import _redis_pool, get_redis_background_pool, redis_settings
-from background.tasks import push_check_price, periodic_delete_old_message
+from background.tasks import (
+    push_check_price,
+    push_check_products_price,
+    reconcile_price_queue,
+    respread_scheduler_jobs,
+    sweep_due_price_checks,
+    periodic_delete_old_message,
+)
 from background.subscriptions import (
     search_users_for_ended_subscription,
     notify_users_about_subscription_ending,
+    reschedule_user_jobs,
 )
-from background.messaging import process_message_sendings
+from background.messaging import process_message_sending_chunk, process_message_sendings
+from services.http_session import close_http_session, get_http_session
+from utils.leader import start_scheduler, stop_leader_election
+from utils.price_history import close_price_history_writer
 
 
 from config import JOB_STORE_URL
@@ -25,23 +36,33 @@ async def startup(ctx):
     if not _redis_pool:
         _redis_pool = await get_redis_background_pool()
 
-    scheduler.start()
+    await start_scheduler(scheduler)
     ctx["scheduler"] = scheduler
+    await get_http_session()
     print("Worker is starting up...")
 
 
 async def shutdown(ctx):
+    await stop_leader_election()
     ctx.pop("scheduler")
+    await close_price_history_writer()
+    await close_http_session()
     print("Worker is shutting down...")
 
 
 class WorkerSettings:
     functions = [
         push_check_price,
+        reconcile_price_queue,
+        sweep_due_price_checks,
+        push_check_products_price,
+        respread_scheduler_jobs,
         periodic_delete_old_message,
         search_users_for_ended_subscription,
         notify_users_about_subscription_ending,
-        func(process_message_sendings, timeout=30 * 60),
+        reschedule_user_jobs,
+        func(process_message_sendings, timeout=10 * 60),
+        func(process_message_sending_chunk, timeout=30 * 60),
     ]
     on_startup = startup
     on_shutdown = shutdown
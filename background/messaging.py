@@ -1,11 +1,12 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram import types
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 
 
 import config
-from commands.send_message import mass_sending_message, notify_admins
+from background.base import get_redis_background_pool
+from commands.send_message import SendResult, mass_sending_message, notify_admins
 from commands.set_users_as_inactive import set_users_as_inactive
 from db.base import (
     get_session,
@@ -13,8 +14,10 @@ from db.base import (
     MessageSendingButton,
     MessageSendingStatus,
     MessageSendingButtonType,
+    MessageSendingChunkStatus,
 )
 from db.repository.message_sending import MessageSendingRepository
+from db.repository.message_sending_chunk import MessageSendingChunkRepository
 from db.repository.message_sending_button import MessageSendingButtonRepository
 from db.repository.user import UserRepository
 
@@ -46,6 +49,63 @@ async def process_message_sendings(_):
         for sending in test_sendings:
             await __safe_process_message_sending(session, ms_repo, sending, True)
 
+        # рассылки, прерванные таймаутом или перезапуском воркера
+        for sending in await ms_repo.get_by_status(MessageSendingStatus.PROCESSING):
+            await __resume_message_sending(session, sending)
+
+
+async def process_message_sending_chunk(_, chunk_id: int):
+    """Отправляет рассылку части пользователей, продолжая с сохранённого места"""
+    stale_before = datetime.now() - timedelta(
+        minutes=config.MESSAGE_SENDING_CHUNK_STALE_MINUTES
+    )
+
+    async for session in get_session():
+        chunk_repo = MessageSendingChunkRepository(session)
+        chunk = await chunk_repo.claim(chunk_id, stale_before)
+        if not chunk:
+            logger.info("Sending chunk %s is already processed", chunk_id)
+            return
+
+        sending = await MessageSendingRepository(session).find_by_id(
+            chunk.message_sending_id
+        )
+        markup = await __create_message_sending_markup(session, sending)
+        message_info = MessageInfo(
+            text=sending.text, markup=markup, photo_id=sending.photo_id
+        )
+
+        user_repo = UserRepository(session)
+        after_id = (
+            chunk.checkpoint_user_id
+            if chunk.checkpoint_user_id is not None
+            else chunk.first_user_id - 1
+        )
+        logger.info(
+            "Processing chunk %s of sending %s from user %s",
+            chunk.id,
+            sending.id,
+            after_id,
+        )
+
+        while user_ids := await user_repo.get_active_ids_between(
+            after_id, chunk.last_user_id, config.MESSAGE_SENDING_BATCH_SIZE
+        ):
+            results = await mass_sending_message(user_ids, [message_info])
+            inactive_count = await set_users_as_inactive(user_ids, results, session)
+            await chunk_repo.save_progress(
+                chunk,
+                checkpoint_user_id=user_ids[-1],
+                users_notified=results.count(SendResult.DELIVERED),
+                users_inactive=inactive_count,
+            )
+            after_id = user_ids[-1]
+
+        await chunk_repo.update_old(
+            chunk.id, status=MessageSendingChunkStatus.COMPLETED
+        )
+        await __finish_message_sending(session, sending)
+
 
 async def __process_message_sending(
     session: AsyncSession,
@@ -75,9 +135,6 @@ async def __process_message_sending(
             f"При создании кнопок для рассылки произошла ошибка:\n{str(e)}"
         ) from e
 
-    user_ids = await __get_user_ids_for_message_sending(session, is_test)
-    logger.info("Got %s user ids for sending %s", len(user_ids), sending.id)
-
     try:
         photo_id = await __get_photo_id(sending)
     except Exception as e:
@@ -116,16 +173,31 @@ async def __process_message_sending(
         return
 
     await __pre_message_sending(sending)
-    await ms_repo.update_old(
-        sending.id,
-        started_at=datetime.now(),
-        users_to_notify=len(user_ids),
-    )
+
+    chunk_repo = MessageSendingChunkRepository(session)
     try:
-        results = await mass_sending_message(user_ids, [message_info])
-        inactive_count = await set_users_as_inactive(user_ids, results, session)
+        # границы частей берутся из потока tg_id, весь список в памяти не нужен
+        users_count, bounds = 0, []
+        async for user_ids in UserRepository(session).iter_active_ids(
+            config.MESSAGE_SENDING_CHUNK_SIZE
+        ):
+            bounds.append((user_ids[0], user_ids[-1]))
+            users_count += len(user_ids)
+        logger.info("Got %s users for sending %s", users_count, sending.id)
+
+        chunk_ids = await chunk_repo.create_chunks(sending.id, bounds)
+        await ms_repo.update_old(
+            sending.id,
+            started_at=datetime.now(),
+            users_to_notify=users_count,
+            users_notified=0,
+            photo_id=photo_id,
+        )
     except Exception as e:
-        logger.error("Error in mass sending %s", sending.id, exc_info=True)
+        logger.error(
+            "Error in creating chunks of sending %s", sending.id, exc_info=True
+        )
+        await session.rollback()
         await ms_repo.update_old(
             sending.id,
             status=MessageSendingStatus.FAILED,
@@ -135,15 +207,64 @@ async def __process_message_sending(
             f"При выполнении рассылки произошла ошибка:\n{str(e)}"
         ) from e
 
-    await __post_message_sending(sending, len(user_ids), inactive_count)
+    logger.info("Sending %s is split into %s chunks", sending.id, len(chunk_ids))
+    if not chunk_ids:
+        await __finish_message_sending(session, sending)
+        return
+
+    await __enqueue_chunks(chunk_ids)
 
-    await ms_repo.update_old(
-        sending.id,
-        status=MessageSendingStatus.COMPLETED,
-        users_notified=len(user_ids) - inactive_count,
-        ended_at=datetime.now(),
-        error_message="",
+
+async def __resume_message_sending(session: AsyncSession, sending: MessageSending):
+    chunks = await MessageSendingChunkRepository(session).get_by_message_sending(
+        sending.id
+    )
+    if not chunks:
+        # рассылка начата до разделения на части, продолжить её нельзя
+        return
+
+    stale_before = datetime.now() - timedelta(
+        minutes=config.MESSAGE_SENDING_CHUNK_STALE_MINUTES
+    )
+    chunk_ids = [
+        chunk.id
+        for chunk in chunks
+        if chunk.status == MessageSendingChunkStatus.PENDING
+        or (
+            chunk.status == MessageSendingChunkStatus.PROCESSING
+            and (chunk.heartbeat_at is None or chunk.heartbeat_at < stale_before)
+        )
+    ]
+    if chunk_ids:
+        logger.info("Resuming %s chunks of sending %s", len(chunk_ids), sending.id)
+        await __enqueue_chunks(chunk_ids)
+        return
+
+    if all(chunk.status == MessageSendingChunkStatus.COMPLETED for chunk in chunks):
+        await __finish_message_sending(session, sending)
+
+
+async def __enqueue_chunks(chunk_ids: list[int]):
+    redis_pool = await get_redis_background_pool()
+    for chunk_id in chunk_ids:
+        # повторная постановка части, задача которой ещё в очереди, игнорируется
+        await redis_pool.enqueue_job(
+            "process_message_sending_chunk",
+            chunk_id,
+            _queue_name="arq:low",
+            _job_id=f"message_sending_chunk_{chunk_id}",
+        )
+
+
+async def __finish_message_sending(session: AsyncSession, sending: MessageSending):
+    """Завершает рассылку, если все её части обработаны"""
+    if not await MessageSendingRepository(session).complete_if_finished(sending.id):
+        return
+
+    inactive_count = await MessageSendingChunkRepository(session).get_inactive_count(
+        sending.id
     )
+    await __post_message_sending(sending, sending.users_to_notify or 0, inactive_count)
 
 
 async def __safe_process_message_sending(
@@ -171,18 +292,6 @@ async def __get_photo_id(sending: MessageSending) -> str | None:
     return photo_id
 
 
-async def __get_user_ids_for_message_sending(
-    session: AsyncSession, is_test: bool
-) -> list[int]:
-    logger.info("Getting user ids")
-    if is_test:
-        return [config.ADMINS_CHAT_ID]
-
-    repo = UserRepository(session)
-    users = await repo.get_active()
-    return [user.tg_id for user in users]
-
-
 async def __create_message_sending_markup(
     session: AsyncSession, sending: MessageSending
 ) -> types.ReplyKeyboardMarkup | types.InlineKeyboardMarkup | None:
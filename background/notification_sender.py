@@ -0,0 +1,261 @@
+"""Отправитель уведомлений из outbox (services.notification_outbox).
+
+Запуск: python -m background.notification_sender
+
+Соблюдает общие для всех процессов лимиты бота и чата
+(services.telegram_limits), при TelegramRetryAfter приостанавливает
+отправку всеми процессами. last_send_price доставленных уведомлений
+записывается пачкой после каждой порции сообщений
+"""
+
+import asyncio
+import json
+import os
+import socket
+import time
+
+from aiogram.exceptions import (
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.types import InlineKeyboardMarkup, Message
+from redis.exceptions import RedisError, ResponseError
+
+import config
+from bot22 import bot
+from db.base import get_session
+from db.repository.user import UserRepository
+from logger import logger
+from services.notification_outbox import OUTBOX_GROUP, OUTBOX_KEY
+from services.telegram_limits import is_user_chat, pause_sending, wait_for_send_slot
+from utils.any import add_message_to_delete_dict
+from utils.scheduler import save_price_check_results
+from utils.storage import redis_client
+from utils.user_cache import forget_users
+
+# Сообщения, не подтверждённые упавшим отправителем, забираются другим
+CLAIM_IDLE_MS = 60_000
+CLAIM_INTERVAL_SECONDS = 60
+# Больше ждать по TelegramRetryAfter ради одного сообщения не имеет смысла
+MAX_FLOOD_WAIT_SECONDS = 300
+
+_consumer = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def run_sender():
+    await __create_group()
+
+    last_claim = 0.0
+    while True:
+        try:
+            entries = []
+            if time.monotonic() - last_claim > CLAIM_INTERVAL_SECONDS:
+                last_claim = time.monotonic()
+                _, entries, *_ = await redis_client.xautoclaim(
+                    OUTBOX_KEY,
+                    OUTBOX_GROUP,
+                    _consumer,
+                    min_idle_time=CLAIM_IDLE_MS,
+                    count=config.NOTIFICATION_SENDER_BATCH_SIZE,
+                )
+
+            if not entries:
+                response = await redis_client.xreadgroup(
+                    OUTBOX_GROUP,
+                    _consumer,
+                    {OUTBOX_KEY: ">"},
+                    count=config.NOTIFICATION_SENDER_BATCH_SIZE,
+                    block=5000,
+                )
+                entries = response[0][1] if response else []
+
+            if entries:
+                await process_entries(entries)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error("Error in notification sender loop", exc_info=True)
+            await asyncio.sleep(1)
+
+
+async def process_entries(entries: list[tuple[bytes, dict]]):
+    """Отправляет порцию сообщений: в разные чаты - параллельно,
+    в один чат - по порядку"""
+    chats: dict[int | str, list[tuple[bytes, dict]]] = {}
+    for entry_id, fields in entries:
+        data = json.loads(fields[b"data"])
+        chats.setdefault(data["chat_id"], []).append((entry_id, data))
+
+    last_send_prices: dict[int, dict] = {}
+    pending_ids = {entry_id for entry_id, _ in entries}
+
+    async def deliver_chat(messages: list[tuple[bytes, dict]]):
+        for entry_id, data in messages:
+            try:
+                if await __deliver(data) and data.get("user_product_id"):
+                    last_send_prices[data["user_product_id"]] = {
+                        "last_send_price": data["price"]
+                    }
+            except Exception:
+                logger.error(
+                    "Error delivering notification to %s",
+                    data["chat_id"],
+                    exc_info=True,
+                )
+            # сообщение доставлено или отброшено - повторно его не отправляем
+            pending_ids.discard(entry_id)
+            await __ack(entry_id)
+
+    keeper = asyncio.create_task(__keep_claimed(pending_ids))
+    try:
+        await asyncio.gather(*(deliver_chat(messages) for messages in chats.values()))
+    finally:
+        keeper.cancel()
+
+    try:
+        await save_price_check_results(last_send_prices)
+    except Exception:
+        logger.error(
+            "Can't save last send prices for %s user products",
+            len(last_send_prices),
+            exc_info=True,
+        )
+
+
+async def __keep_claimed(pending_ids: set[bytes]):
+    """Пока порция отправляется (в т.ч. ждёт TelegramRetryAfter),
+    сбрасывает время простоя её сообщений, чтобы их не забрал
+    через XAUTOCLAIM другой отправитель"""
+    while True:
+        await asyncio.sleep(CLAIM_IDLE_MS / 1000 / 3)
+        if not pending_ids:
+            continue
+
+        try:
+            await redis_client.xclaim(
+                OUTBOX_KEY,
+                OUTBOX_GROUP,
+                _consumer,
+                min_idle_time=0,
+                message_ids=list(pending_ids),
+                justid=True,
+            )
+        except RedisError:
+            logger.warning("Can't refresh claimed notifications", exc_info=True)
+
+
+async def __ack(entry_id: bytes):
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.xack(OUTBOX_KEY, OUTBOX_GROUP, entry_id)
+            pipe.xdel(OUTBOX_KEY, entry_id)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Can't ack notification %s", entry_id, exc_info=True)
+
+
+async def __deliver(data: dict) -> bool:
+    chat_id = data["chat_id"]
+
+    attempt = 0
+    flood_wait = 0
+    while attempt < config.NOTIFICATION_SENDER_MAX_ATTEMPTS:
+        await wait_for_send_slot(chat_id)
+
+        try:
+            msg = await __send(data)
+        except TelegramRetryAfter as e:
+            # Telegram просит только подождать - попытка не тратится,
+            # но суммарное ожидание ограничено
+            flood_wait += e.retry_after
+            if flood_wait > MAX_FLOOD_WAIT_SECONDS:
+                logger.warning(
+                    "Notification to %s dropped after %s s of flood wait",
+                    chat_id,
+                    flood_wait,
+                )
+                await pause_sending(e.retry_after)
+                return False
+
+            logger.warning("Telegram flood control, pause for %s s", e.retry_after)
+            await pause_sending(e.retry_after)
+            continue
+        except TelegramForbiddenError:
+            if is_user_chat(chat_id):
+                logger.info(
+                    "User %s blocked the bot, marking user as inactive", chat_id
+                )
+                async for session in get_session():
+                    await UserRepository(session).set_as_inactive([chat_id])
+                await forget_users([chat_id])
+            else:
+                logger.warning("Bot can't send messages to chat %s", chat_id)
+            return False
+        except (TelegramNetworkError, TelegramServerError):
+            attempt += 1
+            logger.warning(
+                "Can't send notification to %s, attempt %s",
+                chat_id,
+                attempt,
+                exc_info=True,
+            )
+            await asyncio.sleep(attempt)
+            continue
+        except Exception:
+            logger.error("Can't send notification to %s", chat_id, exc_info=True)
+            return False
+
+        if data.get("delete_later"):
+            await add_message_to_delete_dict(msg)
+        return True
+
+    logger.error("Notification to %s dropped after %s attempts", chat_id, attempt)
+    return False
+
+
+async def __send(data: dict) -> Message:
+    reply_markup = (
+        InlineKeyboardMarkup.model_validate(data["reply_markup"])
+        if data.get("reply_markup")
+        else None
+    )
+
+    if data.get("photo_id"):
+        return await bot.send_photo(
+            chat_id=data["chat_id"],
+            photo=data["photo_id"],
+            caption=data["text"],
+            disable_notification=data.get("disable_notification", False),
+            reply_markup=reply_markup,
+        )
+
+    return await bot.send_message(
+        chat_id=data["chat_id"],
+        text=data["text"],
+        disable_notification=data.get("disable_notification", False),
+        reply_markup=reply_markup,
+    )
+
+
+async def __create_group():
+    try:
+        await redis_client.xgroup_create(
+            OUTBOX_KEY, OUTBOX_GROUP, id="0", mkstream=True
+        )
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def main():
+    logger.info("Notification sender %s is starting up...", _consumer)
+    try:
+        await run_sender()
+    finally:
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
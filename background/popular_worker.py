@@ -1,12 +1,15 @@
 from background.tasks import push_check_popular_product
 from background.base import redis_settings, _redis_pool, get_redis_background_pool
+from services.http_session import close_http_session, get_http_session
 
 
 async def startup(ctx):
+    await get_http_session()
     print("Worker is starting up...")
 
 
 async def shutdown(ctx):
+    await close_http_session()
     print("Worker is shutting down...")
 
 
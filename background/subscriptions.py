@@ -14,6 +14,7 @@ from db.repository.subscription import SubscriptionRepository
 from db.repository.user import UserRepository
 from db.repository.user_product import UserProductRepository
 from db.repository.user_product_job import UserProductJobRepository
+from utils.scheduler import remove_job_if_exists, reschedule_user_product_jobs
 
 from logger import logger
 
@@ -25,15 +26,12 @@ async def notify_users_about_subscription_ending(ctx):
 
         for days in [5, 1]:
             logger.info("Searching for users which subscription ends in %s days", days)
-            users_to_notify = await repo.get_users_which_subscription_ends(days)
-            if not users_to_notify:
-                logger.info("No one to notify")
-                continue
-
-            logger.info("Found %s users to notify", len(users_to_notify))
+            notified = 0
+            async for user_ids in repo.iter_ids_which_subscription_ends(days):
+                await subscription_is_about_to_end(user_ids, session, days)
+                notified += len(user_ids)
 
-            user_ids = [user.tg_id for user in users_to_notify]
-            await subscription_is_about_to_end(user_ids, session, days)
+            logger.info("Notified %s users", notified)
 
 
 async def search_users_for_ended_subscription(ctx):
@@ -98,11 +96,19 @@ async def drop_users_subscription(
                 await upj_repo.delete_by_product_id(product.id)
                 await up_repo.delete(product)
 
-                scheduler.remove_job(job_id=job_id, jobstore="sqlalchemy")
+                remove_job_if_exists(scheduler, job_id)
+
+        await reschedule_user_product_jobs(scheduler, user.tg_id, session)
 
     await drop_users_punkt(user, session)
 
 
+async def reschedule_user_jobs(ctx, user_id: int):
+    scheduler = ctx.get("scheduler")
+    async for session in get_session():
+        await reschedule_user_product_jobs(scheduler, user_id, session)
+
+
 async def drop_users_punkt(user: User, session: AsyncSession):
     logger.info("Dropping punkt for user %s [%s]", user.username, user.tg_id)
     async with session:
@@ -1,12 +1,15 @@
 import json
 import asyncio
+from collections import Counter
 from math import ceil
 from datetime import datetime, timedelta
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.exceptions import WatchError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from commands.send_message import modify_message, send_message
+import config
+from commands.send_message import modify_message, notify_admins, send_message
 from db.base import Category, Product, Punkt, get_session, UserProduct
 
 from db.repository.popular_product import PopularProductRepository
@@ -25,24 +28,55 @@ from background.base import get_redis_background_pool
 from bot22 import bot
 
 from schemas import MessageInfo
+from services.circuit_breaker import get_circuit_breaker
+from services.notification_outbox import enqueue_notification
 from services.ozon.ozon_api_service import OzonAPIService
+from services.rate_limiter import RequestPriority, request_priority
 from services.wb.wb_api_service import WbAPIService
 from utils.escape import escape_markdown
-from utils.prices import get_product_price
+from utils.polling import (
+    get_next_check_interval,
+    is_check_due,
+    popular_product_polling_key,
+    schedule_next_check,
+    user_product_polling_key,
+)
+from utils.price_history import is_price_history_due, record_product_price
+from utils.price_queue import (
+    add_price_checks,
+    decode_price_check,
+    encode_price_check,
+    pop_due_price_checks,
+    remove_price_checks,
+    respread_price_checks,
+    schedule_price_checks,
+)
+from utils.prices import (
+    get_delivery_zone,
+    get_product_price,
+    get_product_price_for_zone,
+    get_wb_products_prices,
+)
 from utils.storage import redis_client
 from utils.any import (
+    MESSAGES_ON_DELETE_TTL_SECONDS,
     generate_pretty_amount,
     add_message_to_delete_dict,
     generate_percent_to_popular_product,
+    messages_on_delete_key,
 )
 from utils.exc import OzonProductExistsError, WbProductExistsError
 from utils.scheduler import (
+    POPULAR_PRODUCT_CHECK_INTERVAL_MINUTES,
+    pause_user_product_jobs,
+    respread_jobs,
     new_save_product,
     save_popular_product,
-    try_add_product_price_to_db,
-    update_last_send_price_by_user_product,
 )
-from utils.subscription import get_user_subscription_limit
+from utils.subscription import (
+    DEFAULT_CHECK_INTERVAL_MINUTES,
+    get_user_subscription_limit,
+)
 from logger import logger
 
 
@@ -52,6 +86,7 @@ BOT_BATCH_ACTION_DELAY = 0.2
 
 
 async def new_add_product_task(ctx, user_data: dict):
+    request_priority.set(RequestPriority.INTERACTIVE)
     try:
         scheduler: AsyncIOScheduler = ctx.get("scheduler")
         product_marker: str = user_data.get("product_marker")
@@ -124,26 +159,47 @@ async def new_add_product_task(ctx, user_data: dict):
 async def push_check_price(ctx, user_id, product_id: str):
     logger.info("Новая фоновая задача %s", ctx["job_id"])
 
+    if config.PRICE_POLLING_MODE == "product":
+        # цены проверяются задачей push_check_products_price
+        return
+
+    polling_key = user_product_polling_key(int(product_id))
+    # до обращения к БД: большинство запусков адаптивный опрос пропускает
+    if not await is_check_due(polling_key):
+        return
+
     async for session in get_session():
-        product_repo = ProductRepository(session)
-        user_product_repo = UserProductRepository(session)
-        punkt_repo = PunktRepository(session)
+        context = (
+            await UserProductRepository(session).get_price_check_contexts(
+                [int(product_id)]
+            )
+        ).get(int(product_id))
 
-        user_product = await user_product_repo.find_by_id(product_id)
-        if not user_product or user_id != user_product.user_id:
+        if not context or user_id != context.user_product.user_id:
             logger.error(
                 "Can't find user product %s or user_id not matching", product_id
             )
             # TODO: drop job
             return
 
-        product = await product_repo.find_by_id(user_product.product_id)
-        if not product:
-            logger.error("Can't find product for user product %s", product_id)
-            # TODO: drop job
+        if not context.is_user_active:
+            # задачи возобновятся, когда пользователь снова напишет боту
+            await pause_user_product_jobs(ctx.get("scheduler"), user_id, session)
             return
 
-        punkt = await punkt_repo.get_users_punkt(user_id)
+    user_product, product, punkt = (
+        context.user_product,
+        context.product,
+        context.punkt,
+    )
+
+    if await get_circuit_breaker(product.product_marker).is_open():
+        logger.info(
+            "Skip price check for user_product %s, %s api is unavailable",
+            product_id,
+            product.product_marker,
+        )
+        return
 
     city = punkt.city if punkt else None
     _product_price = await get_product_price(product, punkt)
@@ -155,40 +211,289 @@ async def push_check_price(ctx, user_id, product_id: str):
 
     _product_price = float(_product_price)
 
-    product_name = product.name if product.name else "Отсутствует"
+    price_changed = user_product.actual_price != _product_price
+    if price_changed:
+        await __apply_user_product_prices(
+            {user_product.id: _product_price}, {product.id: product}
+        )
+    else:
+        print(f"Цена не изменилась user {user_id} product {product.name}")
+
+    # время последней записи уже загружено - без лишнего обращения к Redis
+    if is_price_history_due(context.last_price_time):
+        await record_product_price(product.id, city, _product_price)
+
+    await schedule_next_check(
+        polling_key,
+        product.id,
+        city,
+        base_interval=context.check_interval or DEFAULT_CHECK_INTERVAL_MINUTES,
+        price_changed=price_changed,
+    )
+
+
+async def reconcile_price_queue(_):
+    """Добавляет в очередь проверок цен пары (товар, зона доставки), которых там нет.
+    Пары, которые больше никто не отслеживает, удаляются из очереди при проверке"""
+    async for session in get_session():
+        user_product_repo = UserProductRepository(session)
+        product_zones = await user_product_repo.get_tracked_product_zones(
+            config.WB_DEFAULT_DELIVERY_ZONE
+        )
+
+    logger.info("Reconciling price queue with %s product zones", len(product_zones))
+    # недостающие пары распределяем по интервалу, а не проверяем разом
+    await add_price_checks(
+        [
+            encode_price_check(marker, product_id, zone)
+            for product_id, marker, zone in product_zones
+        ],
+        spread_seconds=DEFAULT_CHECK_INTERVAL_MINUTES * 60,
+    )
+
+
+async def respread_scheduler_jobs(ctx):
+    """Перераспределяет задачи проверки цен и очередь проверок по времени"""
+    respread_jobs_count = await respread_jobs(ctx.get("scheduler"))
+
+    respread_checks_count = 0
+    if config.PRICE_POLLING_MODE == "product":
+        respread_checks_count = await respread_price_checks(
+            DEFAULT_CHECK_INTERVAL_MINUTES * 60
+        )
+
+    await notify_admins(
+        MessageInfo(
+            text=f"Перераспределено задач планировщика: {respread_jobs_count}, "
+            f"проверок в очереди: {respread_checks_count}"
+        )
+    )
+
+
+async def sweep_due_price_checks(_):
+    """Забирает из очереди проверки, время которых наступило,
+    и ставит их в arq пачками по PRICE_CHECK_BATCH_SIZE"""
+    # пока API маркетплейса недоступно, его проверки откладываются
+    unavailable_markers = {
+        marker
+        for marker in ("ozon", "wb")
+        if await get_circuit_breaker(marker).is_open()
+    }
+
+    redis_pool = await get_redis_background_pool()
+    dispatched = deferred = 0
+    for _ in range(config.PRICE_CHECK_SWEEP_MAX_BATCHES):
+        members = await pop_due_price_checks(config.PRICE_CHECK_BATCH_SIZE)
+        if not members:
+            break
+
+        batch, unavailable = [], []
+        for member in members:
+            marker, _, _ = decode_price_check(member)
+            if marker in unavailable_markers:
+                unavailable.append(member)
+            else:
+                batch.append(member)
+
+        await schedule_price_checks(unavailable, config.API_CIRCUIT_OPEN_SECONDS)
+        deferred += len(unavailable)
+
+        if batch:
+            await redis_pool.enqueue_job(
+                "push_check_products_price", batch, _queue_name="arq:low"
+            )
+            dispatched += len(batch)
+
+        if len(members) < config.PRICE_CHECK_BATCH_SIZE:
+            break
+
+    logger.info(
+        "Dispatched %s price checks, deferred %s for unavailable apis",
+        dispatched,
+        deferred,
+    )
+
+
+async def push_check_products_price(_, members: list[str]):
+    """Проверяет цены пачки пар (товар, зона доставки) из очереди проверок.
+    Цена каждой пары запрашивается один раз и применяется ко всем товарам
+    пользователей, отслеживающих товар в этой зоне"""
+    checks = [decode_price_check(member) for member in members]
+    logger.info("New price check for %s product zones", len(checks))
+
+    async for session in get_session():
+        product_repo = ProductRepository(session)
+        user_product_repo = UserProductRepository(session)
+
+        products = {
+            product.id: product
+            for product in await product_repo.find_by_ids(
+                list({product_id for _, product_id, _ in checks})
+            )
+        }
+        subscribers = await user_product_repo.get_products_subscribers(
+            [(product_id, zone) for _, product_id, zone in checks],
+            config.WB_DEFAULT_DELIVERY_ZONE,
+        )
+
+    # пары, которые больше никто не отслеживает, убираем из очереди
+    stale = [
+        check
+        for check in checks
+        if check[1] not in products or not subscribers[(check[1], check[2])]
+    ]
+    await remove_price_checks([encode_price_check(*check) for check in stale])
+    checks = [check for check in checks if check not in stale]
+
+    prices: dict[tuple[int, int | None], int | None] = {}
+
+    async def fetch_price(product_id: int, zone: int | None):
+        prices[(product_id, zone)] = await get_product_price_for_zone(
+            products[product_id], zone
+        )
+
+    # WB товары одной зоны запрашиваются пачкой, остальные - параллельно,
+    # нагрузку на API ограничивает общий rate limiter
+    wb_zones: dict[int, list[Product]] = {}
+    other_checks = []
+    for marker, product_id, zone in checks:
+        if marker == "wb":
+            wb_zones.setdefault(zone, []).append(products[product_id])
+        else:
+            other_checks.append(fetch_price(product_id, zone))
+
+    await asyncio.gather(*other_checks)
+    for zone, zone_products in wb_zones.items():
+        zone_prices = await get_wb_products_prices(zone_products, zone)
+        for product in zone_products:
+            prices[(product.id, zone)] = zone_prices.get(product.id)
+
+    # новые цены всех товаров пользователей из пачки применяются одним запросом
+    user_product_prices: dict[int, float] = {}
+    for check in checks:
+        _, product_id, zone = check
+        _product_price = prices.get((product_id, zone))
+        try:
+            if not _product_price:
+                logger.info(
+                    "Can't get price for product %s in zone %s", product_id, zone
+                )
+                await schedule_price_checks(
+                    [encode_price_check(*check)], DEFAULT_CHECK_INTERVAL_MINUTES * 60
+                )
+                continue
+
+            _product_price = float(_product_price)
+            await __record_product_price(
+                products[product_id],
+                zone,
+                subscribers[(product_id, zone)],
+                _product_price,
+            )
+            for user_product, _, _ in subscribers[(product_id, zone)]:
+                if user_product.actual_price != _product_price:
+                    user_product_prices[user_product.id] = _product_price
+        except Exception:
+            logger.error(
+                "Error in checking price for product %s in zone %s",
+                product_id,
+                zone,
+                exc_info=True,
+            )
+            await schedule_price_checks(
+                [encode_price_check(*check)], DEFAULT_CHECK_INTERVAL_MINUTES * 60
+            )
+
+    await __apply_user_product_prices(user_product_prices, products)
+
 
-    await try_add_product_price_to_db(
-        product_id=product.id, city=city, price=_product_price
+async def __record_product_price(
+    product: Product,
+    zone: int | None,
+    subscribers: list[tuple[UserProduct, str | None, int | None]],
+    _product_price: float,
+):
+    """Записывает цену пары (товар, зона) в историю и переносит её проверку"""
+    price_changed = any(
+        user_product.actual_price != _product_price
+        for user_product, _, _ in subscribers
     )
 
-    if _product_price == user_product.actual_price:
-        print(f"Цена не изменилась user {user_id} product {product_name}")
+    for city in {city for _, city, _ in subscribers}:
+        await record_product_price(product.id, city, _product_price)
+
+    # пара проверяется так часто, как нужно самой быстрой подписке
+    interval = await get_next_check_interval(
+        product.id,
+        __get_zone_city(subscribers),
+        min_interval=min(
+            check_interval or DEFAULT_CHECK_INTERVAL_MINUTES
+            for _, _, check_interval in subscribers
+        ),
+        price_changed=price_changed,
+    )
+    await schedule_price_checks(
+        [encode_price_check(product.product_marker, product.id, zone)], interval * 60
+    )
+
+
+def __get_zone_city(
+    subscribers: list[tuple[UserProduct, str | None, int | None]],
+) -> str | None:
+    """Город, по истории цен которого считается интервал проверки пары.
+    Цена пары одинакова во всех городах зоны, поэтому берётся город большинства
+    подписчиков, а при равенстве - первый по алфавиту, чтобы выбор не зависел
+    от порядка строк"""
+    counts = Counter(city for _, city, _ in subscribers if city)
+    if not counts:
+        return None
+
+    return min(counts, key=lambda city: (-counts[city], city))
+
+
+async def __apply_user_product_prices(
+    prices: dict[int, float], products: dict[int, Product]
+):
+    """Обновляет actual_price товаров пользователей (id -> новая цена) и ставит
+    в outbox уведомления пользователям, у которых цена достигла отслеживаемой
+    скидки. Какие товары требуют уведомления, решает
+    UserProductRepository.update_actual_prices, last_send_price записывает
+    отправитель уведомлений после доставки"""
+    if not prices:
         return
 
     async for session in get_session():
-        async with session as _session:
-            up_repo = UserProductRepository(_session)
-            await up_repo.update_old(product_id, actual_price=_product_price)
+        async with session.begin():
+            alerts = await UserProductRepository(session).update_actual_prices(prices)
+
+    for user_product in alerts:
+        try:
+            await __enqueue_price_notification(
+                user_product,
+                products[user_product.product_id],
+                prices[user_product.id],
+            )
+        except Exception:
+            logger.error(
+                "Error in enqueueing price notification for user product %s",
+                user_product.id,
+                exc_info=True,
+            )
 
-    _waiting_price = user_product.start_price - user_product.sale
+
+async def __enqueue_price_notification(
+    user_product: UserProduct, product: Product, _product_price: float
+):
+    """`user_product` - значения до обновления цены, actual_price - прежняя цена"""
+    user_id = user_product.user_id
+    product_id = user_product.id
+    product_name = product.name if product.name else "Отсутствует"
 
     pretty_product_price = generate_pretty_amount(_product_price)
     pretty_actual_price = generate_pretty_amount(user_product.actual_price)
     pretty_sale = generate_pretty_amount(user_product.sale)
     pretty_start_price = generate_pretty_amount(user_product.start_price)
 
-    if _waiting_price < _product_price:
-        return
-
-    # проверка, отправлялось ли уведомление с такой ценой в прошлый раз
-    if user_product.last_send_price is not None and (
-        user_product.last_send_price == _product_price
-    ):
-        print(
-            f"LAST SEND PRICE VALIDATION STOP {user_product.last_send_price} | {_product_price}"
-        )
-        return
-
     if user_product.actual_price < _product_price:
         _text = (
             f"🔄 Цена повысилась, но всё ещё входит в выставленный диапазон "
@@ -223,20 +528,17 @@ async def push_check_price(ctx, user_id, product_id: str):
 
     _kb = add_or_create_close_kb(_kb)
 
-    msg = await bot.send_photo(
+    await enqueue_notification(
         chat_id=user_id,
-        photo=product.photo_id,
-        caption=_text,
-        disable_notification=_disable_notification,
+        text=_text,
+        photo_id=product.photo_id,
         reply_markup=_kb.as_markup(),
+        disable_notification=_disable_notification,
+        delete_later=True,
+        user_product_id=product_id,
+        price=_product_price,
     )
 
-    await update_last_send_price_by_user_product(
-        last_send_price=_product_price, user_product_id=product_id
-    )
-
-    await add_message_to_delete_dict(msg)
-
 
 async def add_popular_product(cxt, product_data: dict):
     scheduler: AsyncIOScheduler = cxt.get("scheduler")
@@ -291,6 +593,18 @@ async def __push_check_popular_product(session: AsyncSession, product_id: int):
         )
         return
 
+    polling_key = popular_product_polling_key(popular_product.id)
+    if not await is_check_due(polling_key):
+        return
+
+    if await get_circuit_breaker(product.product_marker).is_open():
+        logger.info(
+            "Skip popular product %s check, %s api is unavailable",
+            product_id,
+            product.product_marker,
+        )
+        return
+
     _product_price = await get_product_price(product, None)
     if not _product_price:
         logger.error("Can't get price for product %s", product.id)
@@ -298,6 +612,14 @@ async def __push_check_popular_product(session: AsyncSession, product_id: int):
 
     _product_price = float(_product_price)
 
+    await schedule_next_check(
+        polling_key,
+        product.id,
+        None,
+        base_interval=POPULAR_PRODUCT_CHECK_INTERVAL_MINUTES,
+        price_changed=_product_price != popular_product.actual_price,
+    )
+
     if _product_price == popular_product.actual_price:
         print(f"цена не изменилась (популярный товар) product {product.name}")
         return
@@ -401,49 +723,34 @@ async def notify_channels_about_popular_product_sale(
             continue
 
         markup = _kb.as_markup() if channel.is_admin else None
-        _ = await bot.send_photo(
+        await enqueue_notification(
             chat_id=channel.channel_id,
-            photo=photo_id,
-            caption=_text,
-            disable_notification=_disable_notification,
+            text=_text,
+            photo_id=photo_id,
             reply_markup=markup,
+            disable_notification=_disable_notification,
         )
 
-        await asyncio.sleep(BOT_BATCH_ACTION_DELAY)
-
 
 async def periodic_delete_old_message(_, user_id: int):
     """Удаляет старые сообщения пользователя из Redis и Telegram."""
     logger.info("Arq task delete old message user %s", user_id)
 
-    key = f"fsm:{user_id}:{user_id}:data"
-    now = datetime.now()
+    await __migrate_legacy_messages_on_delete(user_id)
 
-    # --- Читаем данные из Redis ---
-    user_data = await redis_client.get(key)
-    if not user_data:
-        logger.debug("No user data found for %s", user_id)
-        return
-
-    json_user_data = json.loads(user_data)
-    dict_msg_on_delete: dict = json_user_data.get("dict_msg_on_delete") or {}
+    key = messages_on_delete_key(user_id)
+    threshold = (datetime.now() - timedelta(hours=DELETE_THRESHOLD_HOURS)).timestamp()
 
-    if not dict_msg_on_delete:
-        logger.debug("No messages to delete for %s", user_id)
-        return
+    # --- Забираем старые сообщения из Redis ---
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.zrangebyscore(key, "-inf", threshold)
+        pipe.zremrangebyscore(key, "-inf", threshold)
+        members, _ = await pipe.execute()
 
-    # --- Фильтруем старые сообщения ---
     expired_messages: dict[int, list[int]] = {}  # {chat_id: [msg_id, ...]}
-    for msg_id, (chat_id, message_date) in list(dict_msg_on_delete.items()):
-        if now - datetime.fromtimestamp(message_date) > timedelta(
-            hours=DELETE_THRESHOLD_HOURS
-        ):
-            expired_messages.setdefault(chat_id, []).append(int(msg_id))
-            del dict_msg_on_delete[msg_id]
-
-    # --- Сохраняем обновленные данные ---
-    json_user_data["dict_msg_on_delete"] = dict_msg_on_delete
-    await redis_client.set(key, json.dumps(json_user_data))
+    for member in members:
+        chat_id, msg_id = member.decode().split(":")
+        expired_messages.setdefault(int(chat_id), []).append(int(msg_id))
 
     # --- Удаляем старые сообщения ---
     if not expired_messages:
@@ -472,7 +779,53 @@ async def periodic_delete_old_message(_, user_id: int):
                 )
 
 
+async def __migrate_legacy_messages_on_delete(user_id: int):
+    """Переносит сообщения на удаление из данных FSM (dict_msg_on_delete)
+    в sorted set пользователя"""
+    fsm_key = f"fsm:{user_id}:{user_id}:data"
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(fsm_key)
+                user_data = await pipe.get(fsm_key)
+                if not user_data or b"dict_msg_on_delete" not in user_data:
+                    return
+
+                json_user_data = json.loads(user_data)
+                dict_msg_on_delete: dict = (
+                    json_user_data.pop("dict_msg_on_delete", None) or {}
+                )
+
+                pipe.multi()
+                pipe.set(fsm_key, json.dumps(json_user_data), keepttl=True)
+                if dict_msg_on_delete:
+                    key = messages_on_delete_key(user_id)
+                    pipe.zadd(
+                        key,
+                        {
+                            f"{chat_id}:{msg_id}": message_date
+                            for msg_id, (chat_id, message_date) in (
+                                dict_msg_on_delete.items()
+                            )
+                        },
+                    )
+                    pipe.expire(key, MESSAGES_ON_DELETE_TTL_SECONDS)
+                await pipe.execute()
+            except WatchError:
+                # пользователь как раз что-то делает в боте - пробуем снова
+                continue
+
+            logger.info(
+                "Migrated %s messages on delete for user %s",
+                len(dict_msg_on_delete),
+                user_id,
+            )
+            return
+
+
 async def add_punkt_by_user(_, punkt_data: dict):
+    request_priority.set(RequestPriority.INTERACTIVE)
     punkt_action: str = punkt_data.get("punkt_action")
     city: str = punkt_data.get("city")
     city_index: str = punkt_data.get("index")
@@ -577,9 +930,34 @@ async def update_user_product_prices(_, user_id: int):
         )
 
         user_products = await user_prod_repo.get_user_products(user_id)
+        products = {
+            product.id: product
+            for product in await prod_repo.find_by_ids(
+                [user_product.product_id for user_product in user_products]
+            )
+        }
+        if config.PRICE_POLLING_MODE == "product":
+            # у товаров могла смениться зона доставки
+            await add_price_checks(
+                [
+                    encode_price_check(
+                        product.product_marker,
+                        product.id,
+                        get_delivery_zone(product.product_marker, punkt),
+                    )
+                    for product in products.values()
+                ]
+            )
+
+        # цены всех WB товаров пользователя получаем пачкой - зона у них общая
+        wb_prices = await get_wb_products_prices(
+            [p for p in products.values() if p.product_marker == "wb"],
+            get_delivery_zone("wb", punkt),
+        )
+
         not_updated_products: list[Product] = []
         for user_product in user_products:
-            product = await prod_repo.find_by_id(user_product.product_id)
+            product = products.get(user_product.product_id)
             if not product:
                 logger.error(
                     "Ошибка при получении данных продукта пользователя %s",
@@ -588,7 +966,11 @@ async def update_user_product_prices(_, user_id: int):
                 continue
 
             if not await __update_product_price(
-                user_product, product, punkt, user_prod_repo
+                user_product,
+                product,
+                punkt,
+                user_prod_repo,
+                wb_prices.get(product.id),
             ):
                 not_updated_products.append(product)
 
@@ -608,9 +990,11 @@ async def __update_product_price(
     product: Product,
     punkt: Punkt,
     user_product_repo: UserProductRepository,
+    product_price: int | None = None,
 ) -> bool:
     try:
-        product_price = await get_product_price(product, punkt)
+        if not product_price:
+            product_price = await get_product_price(product, punkt)
         if not product_price:
             return False
 
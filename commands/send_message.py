@@ -1,4 +1,13 @@
-from asyncio import sleep
+import asyncio
+from enum import Enum
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
 
 # import config
 from bot22 import bot
@@ -6,6 +15,7 @@ import config
 from logger import logger
 
 from schemas import MessageInfo
+from services.telegram_limits import pause_sending, wait_for_send_slot
 
 
 async def send_message(
@@ -69,26 +79,139 @@ async def pin_message(chat_id: int, message_id: int) -> bool:
     return await bot.pin_chat_message(chat_id=chat_id, message_id=message_id)
 
 
+class SendResult(Enum):
+    DELIVERED = "delivered"
+    # пользователь заблокировал бота, удалил аккаунт или чат не найден
+    BLOCKED = "blocked"
+    # временная ошибка не прошла за MAX_SEND_ATTEMPTS попыток, RetryAfter
+    # дольше MAX_FLOOD_WAIT_SECONDS или сообщение сломано
+    FAILED = "failed"
+
+
+MAX_SEND_ATTEMPTS = 3
+# Сколько секунд одно сообщение может ждать из-за RetryAfter, прежде чем
+# отправка в чат будет считаться неудачной и освободит место в пуле
+MAX_FLOOD_WAIT_SECONDS = 300
+
+
+class _AdaptiveConcurrency:
+    """Ограничение числа одновременных отправок (AIMD): растёт на 1 после
+    каждых `limit` успешных отправок до `maximum`, при RetryAfter уменьшается вдвое
+    """
+
+    def __init__(self, initial: int, maximum: int):
+        self.limit = min(initial, maximum)
+        self.maximum = maximum
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def release(self, result: SendResult | None):
+        async with self._condition:
+            self._active -= 1
+            if result == SendResult.DELIVERED:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def on_flood(self):
+        self.limit = max(1, self.limit // 2)
+        self._successes = 0
+
+
 async def mass_sending_message(
     chat_ids: list[int], messages: list[MessageInfo]
-) -> list[bool]:
+) -> list[SendResult]:
     """Рассылка сообщения пользователям.
-    Возвращает список булевых значений, показывающих успешность отправки сообщения"""
-    output = []
-    for chat_id in chat_ids:
-        try:
-            for message in messages:
-                await send_message(chat_id, message)
-                await sleep(0.05)
-
-            output.append(True)
-        except Exception:
-            logger.info(
-                "Error in sending message to %s. Possibly due to inactivity", chat_id
-            )
-            output.append(False)
+    Возвращает результат отправки каждому пользователю в порядке chat_ids"""
+    results = [SendResult.FAILED] * len(chat_ids)
+    concurrency = _AdaptiveConcurrency(
+        config.MASS_SENDING_INITIAL_CONCURRENCY, config.MASS_SENDING_MAX_CONCURRENCY
+    )
+    queue = iter(enumerate(chat_ids))
+
+    async def worker():
+        for i, chat_id in queue:
+            await concurrency.acquire()
+            result = None
+            try:
+                result = await __send_to_chat(chat_id, messages, concurrency)
+                results[i] = result
+            finally:
+                await concurrency.release(result)
+
+    await asyncio.gather(
+        *(worker() for _ in range(config.MASS_SENDING_MAX_CONCURRENCY))
+    )
 
-    return output
+    logger.info(
+        "Mass sending to %s chats finished: %s delivered, %s blocked, %s failed",
+        len(chat_ids),
+        results.count(SendResult.DELIVERED),
+        results.count(SendResult.BLOCKED),
+        results.count(SendResult.FAILED),
+    )
+    return results
+
+
+async def __send_to_chat(
+    chat_id: int, messages: list[MessageInfo], concurrency: _AdaptiveConcurrency
+) -> SendResult:
+    for message in messages:
+        failures = 0
+        flood_wait = 0
+        while True:
+            await wait_for_send_slot(chat_id)
+            try:
+                await send_message(chat_id, message)
+                break
+            except TelegramRetryAfter as e:
+                # не считается попыткой - сообщение отправится после паузы,
+                # если только чат не ждёт слишком долго
+                logger.warning(
+                    "Telegram flood control in mass sending, pause for %s s",
+                    e.retry_after,
+                )
+                concurrency.on_flood()
+                await pause_sending(e.retry_after)
+
+                flood_wait += e.retry_after
+                if flood_wait > MAX_FLOOD_WAIT_SECONDS:
+                    logger.warning(
+                        "Giving up sending to %s after %s s of flood control",
+                        chat_id,
+                        flood_wait,
+                    )
+                    return SendResult.FAILED
+            except TelegramForbiddenError:
+                return SendResult.BLOCKED
+            except TelegramBadRequest as e:
+                if "chat not found" in e.message.lower():
+                    return SendResult.BLOCKED
+
+                logger.error("Can't send message to %s", chat_id, exc_info=True)
+                return SendResult.FAILED
+            except (TelegramNetworkError, TelegramServerError):
+                failures += 1
+                if failures >= MAX_SEND_ATTEMPTS:
+                    logger.warning(
+                        "Error in sending message to %s", chat_id, exc_info=True
+                    )
+                    return SendResult.FAILED
+
+                await asyncio.sleep(failures)
+            except Exception:
+                logger.error("Can't send message to %s", chat_id, exc_info=True)
+                return SendResult.FAILED
+
+    return SendResult.DELIVERED
 
 
 async def notify_admins(message: MessageInfo):
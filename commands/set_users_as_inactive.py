@@ -1,18 +1,22 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from commands.send_message import SendResult
 from db.repository.user import UserRepository
+from utils.user_cache import forget_users
 
 from logger import logger
 
 
 async def set_users_as_inactive(
-    user_ids: list[int], activity_labels: list[bool], session: AsyncSession
+    user_ids: list[int], results: list[SendResult], session: AsyncSession
 ) -> int:
+    """Помечает неактивными пользователей, которым рассылка не доставлена,
+    потому что они заблокировали бота. Временные ошибки не учитываются"""
     logger.info("Started set users as inactive function")
 
     inactive_users = []
     for i, user_id in enumerate(user_ids):
-        if not activity_labels[i]:
+        if results[i] == SendResult.BLOCKED:
             inactive_users.append(user_id)
 
     if not inactive_users:
@@ -24,5 +28,6 @@ async def set_users_as_inactive(
         repo = UserRepository(session)
         logger.info("Updating...")
         await repo.set_as_inactive(inactive_users)
+    await forget_users(inactive_users)
 
     return len(inactive_users)
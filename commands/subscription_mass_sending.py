@@ -28,9 +28,6 @@ async def subscription_mass_sending():
 
     async for session in get_session():
         repo = UserRepository(session)
-        active_users = await repo.get_active()
-        active_user_ids = [active_user.tg_id for active_user in active_users]
-        logger.info("Found %s active users", len(active_user_ids))
         text = """*⚠️ Важное обновление*
 
 Мы запускаем *подписку за 200 руб. в месяц*, чтобы продолжать развивать бота и добавлять новые возможности.
@@ -61,17 +58,20 @@ async def subscription_mass_sending():
         message2 = MessageInfo(text=text2, markup=kb2.as_markup())
 
         logger.info("Sending...")
-        results = await mass_sending_message(active_user_ids, [message1, message2])
+        users_count, num_set_as_inactive = 0, 0
+        async for active_user_ids in repo.iter_active_ids():
+            results = await mass_sending_message(active_user_ids, [message1, message2])
+            num_set_as_inactive += await set_users_as_inactive(
+                active_user_ids, results, session
+            )
+            users_count += len(active_user_ids)
 
-        logger.info("Finished sending")
-        num_set_as_inactive = await set_users_as_inactive(
-            active_user_ids, results, session
-        )
+        logger.info("Finished sending to %s active users", users_count)
 
     await notify_admins(
         MessageInfo(
             text=(
-                f"Рассылка закончена. Пользователей найдено: {len(active_user_ids)}. "
+                f"Рассылка закончена. Пользователей найдено: {users_count}. "
                 f"Из них {num_set_as_inactive} неактивных"
             )
         )
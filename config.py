@@ -68,6 +68,26 @@ REDIS_PASSWORD = os.environ.get("REDIS_PASSWORD")
 # Bearer authentication token
 BEARER_TOKEN = os.environ.get("BEARER_TOKEN")
 
+# Webhook сразу отвечает Telegram, апдейты обрабатываются в фоне:
+# не больше UPDATES_CONCURRENCY одновременно, апдейты одного чата - по порядку
+UPDATES_CONCURRENCY = int(os.environ.get("UPDATES_CONCURRENCY", 50))
+# Сколько секунд при остановке ждать обработки уже принятых апдейтов
+UPDATES_SHUTDOWN_TIMEOUT_SECONDS = int(
+    os.environ.get("UPDATES_SHUTDOWN_TIMEOUT_SECONDS", 10)
+)
+
+# Пул соединений с БД каждого процесса. Обработчик держит соединение весь
+# апдейт (middlewares.db.LazySession), поэтому DB_POOL_SIZE + DB_MAX_OVERFLOW
+# должно быть не меньше UPDATES_CONCURRENCY, иначе апдейты будут ждать пул
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 20))
+DB_MAX_OVERFLOW = int(
+    os.environ.get("DB_MAX_OVERFLOW", max(UPDATES_CONCURRENCY - DB_POOL_SIZE, 0) + 10)
+)
+
+# Сколько секунд check_user помнит в Redis, что пользователь активен,
+# 0 - кэш отключён
+USER_CACHE_TTL_SECONDS = int(os.environ.get("USER_CACHE_TTL_SECONDS", 600))
+
 
 FEEDBACK_REASON_PREFIX = "feedback_reason"
 
@@ -80,7 +100,119 @@ YANDEX_TOKEN = os.environ.get("YANDEX_TOKEN")
 WB_API_URL = os.environ.get("WB_API_URL")
 OZON_API_URL = os.environ.get("OZON_API_URL")
 API_SERVICES_TIMEOUT = 60
+API_SERVICES_CONNECTIONS_LIMIT = int(
+    os.environ.get("API_SERVICES_CONNECTIONS_LIMIT", 100)
+)
+API_SERVICES_CONNECTIONS_LIMIT_PER_HOST = int(
+    os.environ.get("API_SERVICES_CONNECTIONS_LIMIT_PER_HOST", 20)
+)
+API_SERVICES_KEEPALIVE_TIMEOUT = int(
+    os.environ.get("API_SERVICES_KEEPALIVE_TIMEOUT", 60)
+)
+API_SERVICES_DNS_CACHE_TTL = int(os.environ.get("API_SERVICES_DNS_CACHE_TTL", 300))
+
+# Общие для всех воркеров лимиты запросов к API (запросов в секунду и размер всплеска)
+OZON_API_RATE_PER_SECOND = float(os.environ.get("OZON_API_RATE_PER_SECOND", 10))
+OZON_API_BURST = int(os.environ.get("OZON_API_BURST", 20))
+WB_API_RATE_PER_SECOND = float(os.environ.get("WB_API_RATE_PER_SECOND", 10))
+WB_API_BURST = int(os.environ.get("WB_API_BURST", 20))
+# Доля бакета, доступная только интерактивным задачам (добавление товара, смена ПВЗ)
+API_INTERACTIVE_RESERVED_SHARE = float(
+    os.environ.get("API_INTERACTIVE_RESERVED_SHARE", 0.25)
+)
+# Предохранитель: после стольких ошибок API за окно запросы к нему
+# не выполняются API_CIRCUIT_OPEN_SECONDS секунд
+API_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("API_CIRCUIT_FAILURE_THRESHOLD", 5))
+API_CIRCUIT_FAILURE_WINDOW_SECONDS = int(
+    os.environ.get("API_CIRCUIT_FAILURE_WINDOW_SECONDS", 60)
+)
+API_CIRCUIT_OPEN_SECONDS = int(os.environ.get("API_CIRCUIT_OPEN_SECONDS", 60))
 WB_DEFAULT_DELIVERY_ZONE = -1281648
+# Сколько артикулов WB запрашивать одним запросом
+WB_PRODUCTS_BATCH_SIZE = int(os.environ.get("WB_PRODUCTS_BATCH_SIZE", 100))
+
+# Общий для всех воркеров кэш цен в Redis, 0 - кэш отключён
+PRICE_CACHE_TTL_SECONDS = int(os.environ.get("PRICE_CACHE_TTL_SECONDS", 300))
+# Сколько помнить, что цену товара не удалось распарсить
+PRICE_CACHE_NEGATIVE_TTL_SECONDS = int(
+    os.environ.get("PRICE_CACHE_NEGATIVE_TTL_SECONDS", 60)
+)
+
+
+# Price polling
+# "user_product" - отдельная задача планировщика на каждый товар пользователя
+# "product" - одна проверка цены на пару (товар, зона доставки) для всех пользователей,
+# пары хранятся в очереди проверок (Redis sorted set по времени следующей проверки)
+PRICE_POLLING_MODE = os.environ.get("PRICE_POLLING_MODE", "user_product")
+# Как часто забирать из очереди проверки, время которых наступило
+PRICE_CHECK_SWEEP_INTERVAL_SECONDS = int(
+    os.environ.get("PRICE_CHECK_SWEEP_INTERVAL_SECONDS", 30)
+)
+PRICE_CHECK_BATCH_SIZE = int(os.environ.get("PRICE_CHECK_BATCH_SIZE", 100))
+PRICE_CHECK_SWEEP_MAX_BATCHES = int(os.environ.get("PRICE_CHECK_SWEEP_MAX_BATCHES", 50))
+# Через сколько секунд забранная, но не проверенная пара снова станет доступна
+PRICE_CHECK_LEASE_SECONDS = int(os.environ.get("PRICE_CHECK_LEASE_SECONDS", 600))
+# Как часто сверять очередь с отслеживаемыми товарами в БД
+PRICE_QUEUE_RECONCILE_INTERVAL_MINUTES = int(
+    os.environ.get("PRICE_QUEUE_RECONCILE_INTERVAL_MINUTES", 60)
+)
+
+# Сколько секунд после пропущенного запуска задача ещё может быть выполнена.
+# Остальные пропущенные запуски (например, во время перезапуска) не выполняются,
+# чтобы не запускать все задачи разом
+JOB_MISFIRE_GRACE_SECONDS = int(os.environ.get("JOB_MISFIRE_GRACE_SECONDS", 60))
+
+# Только один процесс (лидер, выбранный через Redis) выполняет задачи планировщика
+SCHEDULER_LEADER_ELECTION = os.environ.get("SCHEDULER_LEADER_ELECTION", "0") == "1"
+SCHEDULER_LEADER_LEASE_SECONDS = int(
+    os.environ.get("SCHEDULER_LEADER_LEASE_SECONDS", 30)
+)
+
+# Адаптивный интервал проверки цен по истории цен товара (ProductPrice).
+# В режиме "user_product" интервал не может быть меньше периода задачи планировщика
+ADAPTIVE_POLLING = os.environ.get("ADAPTIVE_POLLING", "0") == "1"
+POLLING_MIN_INTERVAL_MINUTES = int(os.environ.get("POLLING_MIN_INTERVAL_MINUTES", 15))
+POLLING_MAX_INTERVAL_MINUTES = int(os.environ.get("POLLING_MAX_INTERVAL_MINUTES", 360))
+POLLING_HISTORY_DAYS = int(os.environ.get("POLLING_HISTORY_DAYS", 14))
+POLLING_MIN_HISTORY_SIZE = int(os.environ.get("POLLING_MIN_HISTORY_SIZE", 4))
+
+# История цен (ProductPrice) пишется пачками: когда в буфере воркера набралось
+# PRICE_HISTORY_BATCH_SIZE записей или прошло PRICE_HISTORY_FLUSH_INTERVAL_SECONDS
+PRICE_HISTORY_BATCH_SIZE = int(os.environ.get("PRICE_HISTORY_BATCH_SIZE", 500))
+PRICE_HISTORY_FLUSH_INTERVAL_SECONDS = int(
+    os.environ.get("PRICE_HISTORY_FLUSH_INTERVAL_SECONDS", 10)
+)
+
+# Уведомления отправляет отдельный процесс (python -m background.notification_sender)
+# из outbox в Redis. Общий лимит ниже лимита Telegram (~30 в секунду),
+# чтобы оставался запас для ответов бота в обработчиках
+TELEGRAM_RATE_PER_SECOND = float(os.environ.get("TELEGRAM_RATE_PER_SECOND", 25))
+# Не чаще одного сообщения в чат пользователя за интервал, в группу/канал -
+# не больше 20 в минуту
+TELEGRAM_CHAT_INTERVAL_MS = int(os.environ.get("TELEGRAM_CHAT_INTERVAL_MS", 1000))
+TELEGRAM_GROUP_CHAT_INTERVAL_MS = int(
+    os.environ.get("TELEGRAM_GROUP_CHAT_INTERVAL_MS", 3000)
+)
+NOTIFICATION_SENDER_BATCH_SIZE = int(
+    os.environ.get("NOTIFICATION_SENDER_BATCH_SIZE", 100)
+)
+NOTIFICATION_SENDER_MAX_ATTEMPTS = int(
+    os.environ.get("NOTIFICATION_SENDER_MAX_ATTEMPTS", 3)
+)
+# Рассылки: число одновременных отправок растёт от начального до максимального,
+# пока Telegram не ответит RetryAfter, после чего уменьшается вдвое
+MASS_SENDING_INITIAL_CONCURRENCY = int(
+    os.environ.get("MASS_SENDING_INITIAL_CONCURRENCY", 5)
+)
+MASS_SENDING_MAX_CONCURRENCY = int(os.environ.get("MASS_SENDING_MAX_CONCURRENCY", 30))
+# Рассылка делится на части, каждая обрабатывается отдельной задачей.
+# Прогресс части сохраняется после каждой пачки пользователей
+MESSAGE_SENDING_CHUNK_SIZE = int(os.environ.get("MESSAGE_SENDING_CHUNK_SIZE", 1000))
+MESSAGE_SENDING_BATCH_SIZE = int(os.environ.get("MESSAGE_SENDING_BATCH_SIZE", 100))
+# Часть, прогресс которой не обновлялся столько минут, считается зависшей
+MESSAGE_SENDING_CHUNK_STALE_MINUTES = int(
+    os.environ.get("MESSAGE_SENDING_CHUNK_STALE_MINUTES", 10)
+)
 
 
 FAKE_NOTIFICATION_SECRET = os.environ.get("FAKE_NOTIFICATION_SECRET")
@@ -18,6 +18,7 @@ from sqlalchemy import (
     String,
     ForeignKey,
     Float,
+    Index,
     TIMESTAMP,
     BigInteger,
     Table,
@@ -25,7 +26,7 @@ from sqlalchemy import (
     text,
 )
 
-from config import db_url, _db_url
+from config import DB_MAX_OVERFLOW, DB_POOL_SIZE, db_url, _db_url
 
 
 # Base = declarative_base()
@@ -43,6 +44,10 @@ class Subscription(Base):
     wb_product_limit = Column(Integer)
     ozon_product_limit = Column(Integer)
     price_rub = Column(Integer, nullable=False)
+    # как часто проверять цены товаров пользователей с этой подпиской
+    check_interval_minutes = Column(
+        Integer, nullable=False, default=15, server_default="15"
+    )
 
     users = relationship("User", back_populates="subscription")
 
@@ -213,6 +218,12 @@ class Product(Base):
 
 class UserProduct(Base):
     __tablename__ = "user_products"
+    # постраничный список товаров пользователя, от новых к старым
+    __table_args__ = (
+        Index(
+            "ix_user_products_user_id_time_create_id", "user_id", "time_create", "id"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(BigInteger, ForeignKey("products.id"))
@@ -453,12 +464,46 @@ class MessageSending(Base):
     text = Column(String)
     image = Column(String, nullable=True, default=None)
 
+    # id картинки в Telegram, загружается один раз перед рассылкой
+    photo_id = Column(String, nullable=True, default=None)
+
     # stats
     users_to_notify = Column(Integer, nullable=True, default=None)
     users_notified = Column(Integer, nullable=True, default=None)
     error_message = Column(String)
 
 
+class MessageSendingChunkStatus(enum.Enum):
+    PENDING = "PENDING"
+    PROCESSING = "PROCESSING"
+    COMPLETED = "COMPLETED"
+
+
+class MessageSendingChunk(Base):
+    """Часть рассылки - активные пользователи с tg_id от first_user_id
+    до last_user_id, обрабатывается отдельной задачей"""
+
+    __tablename__ = "message_sending_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    message_sending_id = Column(
+        Integer, ForeignKey("message_sendings.id"), nullable=False, index=True
+    )
+    status = Column(
+        Enum(MessageSendingChunkStatus),
+        nullable=False,
+        default=MessageSendingChunkStatus.PENDING,
+    )
+    first_user_id = Column(BigInteger, nullable=False)
+    last_user_id = Column(BigInteger, nullable=False)
+    # последний обработанный пользователь - с него задача продолжит после сбоя
+    checkpoint_user_id = Column(BigInteger, nullable=True, default=None)
+    users_notified = Column(Integer, nullable=False, default=0, server_default="0")
+    users_inactive = Column(Integer, nullable=False, default=0, server_default="0")
+    # обновляется после каждой пачки, по нему находятся зависшие части
+    heartbeat_at = Column(DateTime, nullable=True, default=None)
+
+
 class MessageSendingButtonType(enum.Enum):
     TEXT = "TEXT"
     DATA = "DATA"
@@ -482,7 +527,12 @@ sync_engine = create_engine(_db_url, echo=False)
 
 Base.prepare(autoload_with=sync_engine)
 
-engine = create_async_engine(db_url, echo=False)
+engine = create_async_engine(
+    db_url,
+    echo=False,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
 session = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 
@@ -11,3 +11,15 @@ class ApschedulerJobRepository:
 
         result = await self.session.execute(text(stmt))
         return [r[0] for r in result]
+
+    async def get_job_ids_page(self, after: str | None, limit: int) -> list[str]:
+        """Идентификаторы задач по порядку, начиная после after"""
+        stmt = (
+            r"SELECT id FROM apscheduler_jobs WHERE id > :after "
+            r"ORDER BY id LIMIT :limit;"
+        )
+
+        result = await self.session.execute(
+            text(stmt), {"after": after or "", "limit": limit}
+        )
+        return [r[0] for r in result]
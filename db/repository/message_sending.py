@@ -1,8 +1,15 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import exists, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.repository.base import BaseRepository
-from db.base import MessageSending, MessageSendingStatus
+from db.base import (
+    MessageSending,
+    MessageSendingChunk,
+    MessageSendingChunkStatus,
+    MessageSendingStatus,
+)
 
 
 class MessageSendingRepository(BaseRepository[MessageSending]):
@@ -15,3 +22,29 @@ class MessageSendingRepository(BaseRepository[MessageSending]):
         )
 
         return result.scalars().all()
+
+    async def complete_if_finished(self, model_id: int) -> bool:
+        """Завершает рассылку, если все её части обработаны. Возвращает True
+        только той задаче, которая завершила рассылку"""
+        unfinished_chunks = exists().where(
+            MessageSendingChunk.message_sending_id == self.model_class.id,
+            MessageSendingChunk.status != MessageSendingChunkStatus.COMPLETED,
+        )
+        result = await self.session.execute(
+            update(self.model_class)
+            .where(
+                self.model_class.id == model_id,
+                self.model_class.status == MessageSendingStatus.PROCESSING,
+                ~unfinished_chunks,
+            )
+            .values(
+                status=MessageSendingStatus.COMPLETED,
+                ended_at=datetime.now(),
+                error_message="",
+            )
+            .returning(self.model_class.id)
+        )
+        completed = result.scalars().first() is not None
+        await self.session.commit()
+
+        return completed
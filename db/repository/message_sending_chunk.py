@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.repository.base import BaseRepository
+from db.base import MessageSending, MessageSendingChunk, MessageSendingChunkStatus
+
+
+class MessageSendingChunkRepository(BaseRepository[MessageSendingChunk]):
+    def __init__(self, session: AsyncSession):
+        super().__init__(session, MessageSendingChunk)
+
+    async def create_chunks(
+        self, message_sending_id: int, bounds: list[tuple[int, int]]
+    ) -> list[int]:
+        """Создаёт части рассылки по границам (first_user_id, last_user_id).
+        Без коммита"""
+        rows = [
+            {
+                "message_sending_id": message_sending_id,
+                "status": MessageSendingChunkStatus.PENDING,
+                "first_user_id": first_user_id,
+                "last_user_id": last_user_id,
+            }
+            for first_user_id, last_user_id in bounds
+        ]
+        if not rows:
+            return []
+
+        result = await self.session.execute(
+            insert(self.model_class).returning(self.model_class.id), rows
+        )
+        return result.scalars().all()
+
+    async def get_by_message_sending(
+        self, message_sending_id: int
+    ) -> list[MessageSendingChunk]:
+        result = await self.session.execute(
+            select(self.model_class).where(
+                self.model_class.message_sending_id == message_sending_id
+            )
+        )
+        return result.scalars().all()
+
+    async def claim(
+        self, chunk_id: int, stale_before: datetime
+    ) -> MessageSendingChunk | None:
+        """Забирает часть в обработку, если её не обрабатывает другая задача:
+        часть ещё не начата или зависла (heartbeat_at раньше `stale_before`)"""
+        result = await self.session.execute(
+            update(self.model_class)
+            .where(
+                self.model_class.id == chunk_id,
+                or_(
+                    self.model_class.status == MessageSendingChunkStatus.PENDING,
+                    (self.model_class.status == MessageSendingChunkStatus.PROCESSING)
+                    & (self.model_class.heartbeat_at < stale_before),
+                ),
+            )
+            .values(
+                status=MessageSendingChunkStatus.PROCESSING,
+                heartbeat_at=datetime.now(),
+            )
+            .returning(self.model_class)
+        )
+        chunk = result.scalars().first()
+        await self.session.commit()
+
+        return chunk
+
+    async def save_progress(
+        self,
+        chunk: MessageSendingChunk,
+        checkpoint_user_id: int,
+        users_notified: int,
+        users_inactive: int,
+    ):
+        """Сохраняет место, до которого обработана часть, и увеличивает
+        счётчики части и всей рассылки одной транзакцией"""
+        await self.session.execute(
+            update(self.model_class)
+            .where(self.model_class.id == chunk.id)
+            .values(
+                checkpoint_user_id=checkpoint_user_id,
+                users_notified=self.model_class.users_notified + users_notified,
+                users_inactive=self.model_class.users_inactive + users_inactive,
+                heartbeat_at=datetime.now(),
+            )
+        )
+        await self.session.execute(
+            update(MessageSending)
+            .where(MessageSending.id == chunk.message_sending_id)
+            .values(
+                users_notified=func.coalesce(MessageSending.users_notified, 0)
+                + users_notified
+            )
+        )
+        await self.session.commit()
+
+    async def get_inactive_count(self, message_sending_id: int) -> int:
+        result = await self.session.execute(
+            select(func.coalesce(func.sum(self.model_class.users_inactive), 0)).where(
+                self.model_class.message_sending_id == message_sending_id
+            )
+        )
+        return result.scalar_one()
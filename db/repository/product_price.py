@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from sqlalchemy import desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -41,3 +43,19 @@ class ProductPriceRepository(BaseRepository[ProductPrice]):
 
         res = await self.session.execute(stmt)
         return res.scalars().first()
+
+    async def get_prices_since(
+        self, product_id: int, city: str, since: datetime
+    ) -> list[int]:
+        stmt = (
+            select(self.model_class.price)
+            .where(
+                self.model_class.product_id == product_id,
+                self.model_class.city == city,
+                self.model_class.time_price >= since,
+            )
+            .order_by(self.model_class.time_price)
+        )
+
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
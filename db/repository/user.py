@@ -1,5 +1,7 @@
 from datetime import date, timedelta
-from sqlalchemy import delete, func, select, update
+from typing import AsyncIterator
+
+from sqlalchemy import Select, delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.repository.base import BaseRepository
@@ -50,12 +52,54 @@ class UserRepository(BaseRepository[User]):
         await self.session.execute(stmt)
         await self.session.commit()
 
-    async def get_active(self) -> list[User]:
-        db_models = await self.session.execute(
-            select(self.model_class).where(self.model_class.is_active.is_(True))
+    async def iter_active_ids(self, batch_size: int = 1000) -> AsyncIterator[list[int]]:
+        """tg_id активных пользователей пачками по возрастанию"""
+        stmt = select(self.model_class.tg_id).where(
+            self.model_class.is_active.is_(True)
+        )
+        async for user_ids in self._iter_ids(stmt, batch_size):
+            yield user_ids
+
+    async def _iter_ids(
+        self, stmt: Select, batch_size: int
+    ) -> AsyncIterator[list[int]]:
+        """Постраничный обход запроса `select(User.tg_id)` по tg_id.
+
+        Каждая пачка - отдельный короткий запрос, поэтому между пачками
+        в той же сессии можно выполнять другие запросы и коммиты"""
+        last_id = None
+        while True:
+            page = stmt.order_by(self.model_class.tg_id).limit(batch_size)
+            if last_id is not None:
+                page = page.where(self.model_class.tg_id > last_id)
+
+            result = await self.session.execute(page)
+            user_ids = result.scalars().all()
+            if not user_ids:
+                return
+
+            yield user_ids
+            if len(user_ids) < batch_size:
+                return
+
+            last_id = user_ids[-1]
+
+    async def get_active_ids_between(
+        self, after_id: int, last_id: int, limit: int
+    ) -> list[int]:
+        """tg_id активных пользователей из (after_id, last_id] по возрастанию"""
+        result = await self.session.execute(
+            select(self.model_class.tg_id)
+            .where(
+                self.model_class.is_active.is_(True),
+                self.model_class.tg_id > after_id,
+                self.model_class.tg_id <= last_id,
+            )
+            .order_by(self.model_class.tg_id)
+            .limit(limit)
         )
 
-        return db_models.scalars().all()
+        return result.scalars().all()
 
     async def set_as_inactive(self, user_ids: list[int]):
         stmt = (
@@ -66,8 +110,18 @@ class UserRepository(BaseRepository[User]):
         await self.session.execute(stmt)
         await self.session.commit()
 
-    async def get_users_which_subscription_ends(self, n: int) -> list[User]:
-        """Получаем пользователей, чья подписка заканчивается через `n` дней"""
+    async def iter_ids_which_subscription_ends(
+        self, n: int, batch_size: int = 1000
+    ) -> AsyncIterator[list[int]]:
+        """tg_id пользователей, чья подписка заканчивается через `n` дней, пачками"""
+        stmt = self._users_which_subscription_ends_stmt(n).with_only_columns(
+            self.model_class.tg_id
+        )
+        async for user_ids in self._iter_ids(stmt, batch_size):
+            yield user_ids
+
+    def _users_which_subscription_ends_stmt(self, n: int) -> Select:
+        """Пользователи, чья подписка заканчивается через `n` дней"""
         today = date.today()
         # Если подписка заканчивается через n дней, то она длится до n-1 дней
         target_date = today + timedelta(days=n - 1)
@@ -93,8 +147,7 @@ class UserRepository(BaseRepository[User]):
             )
         )
 
-        results = await self.session.execute(stmt)
-        return results.scalars().all()
+        return stmt
 
     async def get_users_with_ended_subscription(
         self, paid_subscription_ids: list[int]
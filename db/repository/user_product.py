@@ -1,9 +1,50 @@
-from sqlalchemy import select
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import (
+    Integer,
+    Row,
+    case,
+    cast,
+    column,
+    func,
+    select,
+    tuple_,
+    update,
+    values,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from db.repository.base import BaseRepository
-from db.base import Product, UserProduct
+from db.base import (
+    Product,
+    ProductPrice,
+    Punkt,
+    Subscription,
+    User,
+    UserProduct,
+    UserProductJob,
+)
+
+
+class PriceCheckContext(NamedTuple):
+    """Всё, что нужно задаче проверки цены товара пользователя"""
+
+    user_product: UserProduct
+    product: Product
+    punkt: Punkt | None
+    is_user_active: bool
+    check_interval: int | None
+    last_price_time: datetime | None
+
+
+def _delivery_zone_column(default_wb_zone: int):
+    """Зона доставки, по которой проверяется цена товара пользователя"""
+    return case(
+        (Product.product_marker == "ozon", Punkt.ozon_zone),
+        else_=func.coalesce(Punkt.wb_zone, default_wb_zone),
+    )
 
 
 class UserProductRepository(BaseRepository[UserProduct]):
@@ -50,3 +91,221 @@ class UserProductRepository(BaseRepository[UserProduct]):
 
         result = await self.session.execute(stmt)
         return result.scalars().all()
+
+    async def get_list_counts(self, user_id: int) -> dict[str, int]:
+        """Количество товаров пользователя по маркетплейсам"""
+        # pylint: disable=not-callable
+        stmt = (
+            select(Product.product_marker, func.count())
+            .select_from(UserProduct)
+            .join(Product, UserProduct.product_id == Product.id)
+            .where(UserProduct.user_id == user_id)
+            .group_by(Product.product_marker)
+        )
+
+        result = await self.session.execute(stmt)
+        return dict(result.all())
+
+    async def get_list_page(
+        self,
+        user_id: int,
+        limit: int,
+        after: tuple[datetime, int] | None = None,
+        before: tuple[datetime, int] | None = None,
+        offset: int = 0,
+    ) -> list[Row]:
+        """Страница списка товаров пользователя, от новых к старым.
+
+        after - ключ (time_create, id) последнего товара предыдущей страницы,
+        before - первого товара следующей. Без ключей страница берётся по offset
+        """
+        key = tuple_(UserProduct.time_create, UserProduct.id)
+        stmt = (
+            select(
+                UserProduct.id,
+                UserProduct.link,
+                cast(UserProduct.actual_price, Integer).label("actual_price"),
+                cast(UserProduct.start_price, Integer).label("start_price"),
+                UserProduct.user_id,
+                UserProduct.time_create,
+                Product.product_marker,
+                Product.name,
+                UserProduct.sale,
+                UserProductJob.job_id,
+            )
+            .select_from(UserProduct)
+            .join(Product, UserProduct.product_id == Product.id)
+            .outerjoin(UserProductJob, UserProductJob.user_product_id == UserProduct.id)
+            .where(UserProduct.user_id == user_id)
+            .limit(limit)
+        )
+
+        if before is not None:
+            stmt = stmt.where(key > tuple_(*before)).order_by(
+                UserProduct.time_create, UserProduct.id
+            )
+            result = await self.session.execute(stmt)
+            return result.all()[::-1]
+
+        if after is not None:
+            stmt = stmt.where(key < tuple_(*after))
+        else:
+            stmt = stmt.offset(offset)
+
+        stmt = stmt.order_by(UserProduct.time_create.desc(), UserProduct.id.desc())
+        result = await self.session.execute(stmt)
+        return result.all()
+
+    async def get_tracked_product_zones(
+        self, default_wb_zone: int
+    ) -> list[tuple[int, str, int | None]]:
+        """Уникальные тройки (product_id, marker, зона доставки) всех товаров,
+        отслеживаемых активными пользователями"""
+        zone = _delivery_zone_column(default_wb_zone)
+        stmt = (
+            select(UserProduct.product_id, Product.product_marker, zone)
+            .join(Product, UserProduct.product_id == Product.id)
+            .join(User, User.tg_id == UserProduct.user_id)
+            .outerjoin(Punkt, Punkt.user_id == UserProduct.user_id)
+            .where(User.is_active.is_(True))
+            .distinct()
+        )
+
+        result = await self.session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def get_products_subscribers(
+        self, checks: list[tuple[int, int | None]], default_wb_zone: int
+    ) -> dict[tuple[int, int | None], list[tuple[UserProduct, str | None, int | None]]]:
+        """Товары активных пользователей, отслеживающих пары (product_id, зона)
+        из `checks`, вместе с городом пункта выдачи и интервалом проверки
+        по подписке пользователя. Все пары загружаются одним запросом"""
+        subscribers = {check: [] for check in checks}
+        if not checks:
+            return subscribers
+
+        zone = _delivery_zone_column(default_wb_zone)
+        stmt = (
+            select(UserProduct, Punkt.city, Subscription.check_interval_minutes, zone)
+            .join(Product, UserProduct.product_id == Product.id)
+            .join(User, User.tg_id == UserProduct.user_id)
+            .outerjoin(Subscription, Subscription.id == User.subscription_id)
+            .outerjoin(Punkt, Punkt.user_id == UserProduct.user_id)
+            .where(
+                UserProduct.product_id.in_({product_id for product_id, _ in checks}),
+                User.is_active.is_(True),
+            )
+        )
+
+        result = await self.session.execute(stmt)
+        for user_product, city, check_interval, product_zone in result.all():
+            # у товара могут быть подписчики и в других зонах
+            check = (user_product.product_id, product_zone)
+            if check in subscribers:
+                subscribers[check].append((user_product, city, check_interval))
+
+        return subscribers
+
+    async def has_product_subscribers(
+        self, product_id: int, zone: int | None, default_wb_zone: int
+    ) -> bool:
+        """Отслеживает ли `product_id` в зоне `zone` хоть один активный пользователь"""
+        stmt = (
+            select(UserProduct.id)
+            .join(Product, UserProduct.product_id == Product.id)
+            .join(User, User.tg_id == UserProduct.user_id)
+            .outerjoin(Punkt, Punkt.user_id == UserProduct.user_id)
+            .where(
+                UserProduct.product_id == product_id,
+                User.is_active.is_(True),
+                _delivery_zone_column(default_wb_zone).is_not_distinct_from(zone),
+            )
+            .limit(1)
+        )
+
+        result = await self.session.execute(stmt)
+        return result.first() is not None
+
+    async def get_price_check_contexts(
+        self, user_product_ids: list[int]
+    ) -> dict[int, PriceCheckContext]:
+        """Товары пользователей вместе с товаром, пунктом выдачи, интервалом
+        проверки по подписке и временем последней записи истории цен в городе
+        пункта - одним запросом"""
+        city = func.coalesce(Punkt.city, "МОСКВА")
+        last_price_time = (
+            select(func.max(ProductPrice.time_price))
+            .where(
+                ProductPrice.product_id == UserProduct.product_id,
+                ProductPrice.city == city,
+            )
+            .correlate(UserProduct, Punkt)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                UserProduct,
+                Product,
+                Punkt,
+                User.is_active,
+                Subscription.check_interval_minutes,
+                last_price_time,
+            )
+            .join(Product, UserProduct.product_id == Product.id)
+            .join(User, User.tg_id == UserProduct.user_id)
+            .outerjoin(Subscription, Subscription.id == User.subscription_id)
+            .outerjoin(Punkt, Punkt.user_id == UserProduct.user_id)
+            .where(UserProduct.id.in_(user_product_ids))
+        )
+
+        result = await self.session.execute(stmt)
+        contexts = {}
+        for row in result.all():
+            contexts.setdefault(row[0].id, PriceCheckContext(*row))
+        return contexts
+
+    async def update_many(self, values_by_id: dict[int, dict]):
+        """Обновляет товары пользователей без коммита, для общей транзакции"""
+        for user_product_id, user_product_values in values_by_id.items():
+            await self.session.execute(
+                update(UserProduct)
+                .where(UserProduct.id == user_product_id)
+                .values(**user_product_values)
+            )
+
+    async def update_actual_prices(self, prices: dict[int, float]) -> list[UserProduct]:
+        """Одним запросом обновляет actual_price товаров пользователей
+        (id -> новая цена) и возвращает те из изменившихся, по которым нужно
+        уведомление: цена не выше start_price - sale и ещё не отправлялась.
+
+        Возвращаемые объекты содержат значения до обновления, в том числе прежнюю
+        actual_price: основной запрос не видит изменений, сделанных в WITH"""
+        if not prices:
+            return []
+
+        new_prices = values(
+            column("id", Integer), column("price", Integer), name="new_prices"
+        ).data(
+            [(user_product_id, int(price)) for user_product_id, price in prices.items()]
+        )
+        updated = (
+            update(UserProduct)
+            .where(
+                UserProduct.id == new_prices.c.id,
+                UserProduct.actual_price.is_distinct_from(new_prices.c.price),
+            )
+            .values(actual_price=new_prices.c.price)
+            .returning(UserProduct.id, new_prices.c.price)
+            .cte("updated")
+        )
+        stmt = (
+            select(UserProduct)
+            .join(updated, updated.c.id == UserProduct.id)
+            .where(
+                UserProduct.start_price - UserProduct.sale >= updated.c.price,
+                UserProduct.last_send_price.is_distinct_from(updated.c.price),
+            )
+        )
+
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
@@ -1,8 +1,10 @@
-from sqlalchemy import delete
+from sqlalchemy import column, delete, exists, select, table
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from db.repository.base import BaseRepository
-from db.base import UserProductJob
+from db.base import UserProduct, UserProductJob
+
+apscheduler_jobs = table("apscheduler_jobs", column("id"))
 
 
 class UserProductJobRepository(BaseRepository[UserProductJob]):
@@ -22,3 +24,25 @@ class UserProductJobRepository(BaseRepository[UserProductJob]):
             )
         )
         await self.session.commit()
+
+    async def get_user_job_ids(self, user_id: int) -> list[str]:
+        result = await self.session.execute(
+            select(self.model_class.job_id)
+            .join(UserProduct, UserProduct.id == self.model_class.user_product_id)
+            .where(UserProduct.user_id == user_id)
+        )
+        return result.scalars().all()
+
+    async def get_missing_scheduler_jobs(self) -> list[tuple[str, int, int]]:
+        """(job_id, user_id, user_product_id) задач товаров пользователей,
+        которых нет в хранилище планировщика"""
+        result = await self.session.execute(
+            select(
+                self.model_class.job_id,
+                UserProduct.user_id,
+                self.model_class.user_product_id,
+            )
+            .join(UserProduct, UserProduct.id == self.model_class.user_product_id)
+            .where(~exists().where(apscheduler_jobs.c.id == self.model_class.job_id))
+        )
+        return result.all()
@@ -19,11 +19,7 @@ from sqlalchemy import (
     update,
     delete,
     func,
-    Integer,
-    Float,
-    desc,
 )
-from sqlalchemy.sql.expression import cast
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -83,6 +79,7 @@ from utils.handlers import (
 )
 
 from utils.pics import ImageManager
+from utils.scheduler import remove_job_if_exists, remove_unused_price_check
 from utils.subscription import get_user_subscription_option
 
 from logger import logger
@@ -236,7 +233,7 @@ async def get_faq(
         chat_id=callback.from_user.id, text=_text, reply_markup=_kb.as_markup()
     )
 
-    await add_message_to_delete_dict(faq_msg, state)
+    await add_message_to_delete_dict(faq_msg)
 
     await state.update_data(faq_msg=(faq_msg.chat.id, faq_msg.message_id))
     await callback.answer()
@@ -348,7 +345,7 @@ async def question_callback(
 
     question_msg.append(back_to_faq_msg)
     for _msg in question_msg:
-        await add_message_to_delete_dict(_msg, state)
+        await add_message_to_delete_dict(_msg)
 
     question_msg_list: list[int] = [_msg.message_id for _msg in question_msg]
 
@@ -373,51 +370,26 @@ async def get_all_products_by_user(
 
     data = await state.get_data()
 
-    # pylint: disable=not-callable
-    query = (
-        select(
-            UserProduct.id,
-            UserProduct.link,
-            cast(UserProduct.actual_price, Integer).label("actual_price"),
-            cast(UserProduct.start_price, Integer).label("start_price"),
-            UserProduct.user_id,
-            cast(func.extract("epoch", UserProduct.time_create), Float).label(
-                "time_create"
-            ),
-            Product.product_marker,
-            Product.name,
-            UserProduct.sale,
-            UserProductJob.job_id,
-        )
-        .select_from(UserProduct)
-        .join(Product, UserProduct.product_id == Product.id)
-        .outerjoin(UserProductJob, UserProductJob.user_product_id == UserProduct.id)
-        .where(UserProduct.user_id == message.from_user.id)
-        .order_by(desc(UserProduct.time_create))
-    )
-
     async with session as _session:
-        res = await _session.execute(query)
+        counts = await UserProductRepository(_session).get_list_counts(
+            message.from_user.id
+        )
 
-    product_list = res.fetchall()
+    len_product_list = sum(counts.values())
 
-    if not product_list:
+    if not len_product_list:
         await delete_prev_subactive_msg(data)
 
         sub_active_msg = await message.answer("Нет добавленных продуктов")
 
-        await add_message_to_delete_dict(sub_active_msg, state)
+        await add_message_to_delete_dict(sub_active_msg)
 
         await state.update_data(
             _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
         )
         return
 
-    len_product_list = len(product_list)
-
-    product_list = list(map(tuple, product_list))
-
-    wb_product_count = sum(1 for product in product_list if product[6] == "wb")
+    wb_product_count = counts.get("wb", 0)
     ozon_product_count = len_product_list - wb_product_count
 
     pages = ceil(len_product_list / DEFAULT_PAGE_ELEMENT_COUNT)
@@ -427,12 +399,11 @@ async def get_all_products_by_user(
         "len_product_list": len_product_list,
         "pages": pages,
         "current_page": current_page,
-        "product_list": product_list,
         "ozon_product_count": ozon_product_count,
         "wb_product_count": wb_product_count,
     }
 
-    await new_show_product_list(view_product_dict, message.from_user.id, state)
+    await new_show_product_list(view_product_dict, message.from_user.id, state, session)
 
     try:
         await message.delete()
@@ -476,7 +447,7 @@ async def get_settings(
         chat_id=message.from_user.id, text=_text, reply_markup=_kb.as_markup()
     )
 
-    await add_message_to_delete_dict(settings_msg, state)
+    await add_message_to_delete_dict(settings_msg)
 
     await state.update_data(
         settings_msg=(settings_msg.chat.id, settings_msg.message_id)
@@ -650,7 +621,7 @@ async def new_go_to_selected_page(
 
     product_dict["current_page"] = int(selected_page)
 
-    await new_show_product_list(product_dict, callback.from_user.id, state)
+    await new_show_product_list(product_dict, callback.from_user.id, state, session)
     await callback.answer()
 
 
@@ -676,7 +647,9 @@ async def new_switch_page(
     else:
         product_dict["current_page"] -= 1
 
-    await new_show_product_list(product_dict, callback.from_user.id, state)
+    await new_show_product_list(
+        product_dict, callback.from_user.id, state, session, move=callback_data
+    )
     await callback.answer()
 
 
@@ -759,7 +732,10 @@ async def new_back_to_product_list(
 
     if product_dict:
         await new_show_product_list(
-            product_dict=product_dict, user_id=callback.from_user.id, state=state
+            product_dict=product_dict,
+            user_id=callback.from_user.id,
+            state=state,
+            session=session,
         )
         await callback.answer()
     else:
@@ -797,10 +773,16 @@ async def new_delete_callback(
         up_repo = UserProductRepository(session)
 
         try:
+            user_product = await up_repo.find_by_id(int(product_id))
+
             await upj_repo.delete_by_job_id(job_id)
             await up_repo.delete_by_id(int(product_id))
 
-            scheduler.remove_job(job_id=job_id, jobstore="sqlalchemy")
+            remove_job_if_exists(scheduler, job_id)
+            if user_product:
+                await remove_unused_price_check(
+                    user_product.product_id, marker, user_product.user_id, session
+                )
         except Exception as ex:
             print(ex)
             await session.rollback()
@@ -816,36 +798,28 @@ async def new_delete_callback(
 
     product_dict: dict = data.get("view_product_dict")
 
-    pages: int = product_dict.get("pages")
     current_page: int = product_dict.get("current_page")
-    product_list: list = product_dict.get("product_list")
+    len_product_list: int = product_dict.get("len_product_list")
     ozon_product_count: int = product_dict.get("ozon_product_count")
     wb_product_count: int = product_dict.get("wb_product_count")
     list_msg: tuple = product_dict.get("list_msg")
 
-    for idx, product in enumerate(product_list):
-        if product[0] == int(product_id) and product[6] == marker:
-            del product_list[idx]
-
     if marker == "wb":
         wb_product_count -= 1
     else:
         ozon_product_count -= 1
 
-    len_product_list = len(product_list)
+    len_product_list -= 1
 
     pages = ceil(len_product_list / DEFAULT_PAGE_ELEMENT_COUNT)
 
     if current_page > pages:
         current_page -= 1
 
-    len_product_list = len(product_list)
-
     view_product_dict = {
         "len_product_list": len_product_list,
         "pages": pages,
         "current_page": current_page,
-        "product_list": product_list,
         "ozon_product_count": ozon_product_count,
         "wb_product_count": wb_product_count,
         "list_msg": list_msg,
@@ -916,7 +890,7 @@ async def new_edit_sale_callback(
         reply_markup=_kb.as_markup(),
     )
 
-    await add_message_to_delete_dict(msg, state)
+    await add_message_to_delete_dict(msg)
 
     await state.update_data(msg=(msg.chat.id, msg.message_id))
     await callback.answer()
@@ -963,7 +937,7 @@ async def new_edit_sale_proccess(
             reply_markup=kb.as_markup(),
         )
 
-        await add_message_to_delete_dict(sub_active_msg, state)
+        await add_message_to_delete_dict(sub_active_msg)
 
         await state.update_data(
             _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
@@ -988,7 +962,7 @@ async def new_edit_sale_proccess(
         )
         await state.set_state()
 
-        await add_message_to_delete_dict(sub_active_msg, state)
+        await add_message_to_delete_dict(sub_active_msg)
 
         await state.update_data(
             _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
@@ -1015,7 +989,7 @@ async def new_edit_sale_proccess(
             )
         )
 
-        await add_message_to_delete_dict(sub_active_msg, state)
+        await add_message_to_delete_dict(sub_active_msg)
 
         await state.update_data(
             _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
@@ -1047,7 +1021,7 @@ async def new_edit_sale_proccess(
         else:
             sub_active_msg = await message.answer("Скидка обновлена")
 
-    await add_message_to_delete_dict(sub_active_msg, state)
+    await add_message_to_delete_dict(sub_active_msg)
 
     await state.update_data(
         sale_data=None, _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
@@ -1056,7 +1030,10 @@ async def new_edit_sale_proccess(
 
     if with_redirect:
         await new_show_product_list(
-            product_dict=product_dict, user_id=message.from_user.id, state=state
+            product_dict=product_dict,
+            user_id=message.from_user.id,
+            state=state,
+            session=session,
         )
     else:
         try:
@@ -1202,7 +1179,7 @@ async def view_graphic(
                 reply_markup=_kb.as_markup(),
             )
 
-            await add_message_to_delete_dict(photo_msg, state)
+            await add_message_to_delete_dict(photo_msg)
             await callback.answer()
     except Exception as ex:
         print(ex)
@@ -1336,7 +1313,7 @@ async def new_view_product(
                 chat_id=callback.from_user.id, text=_text, reply_markup=_kb.as_markup()
             )
 
-            await add_message_to_delete_dict(list_msg, state)
+            await add_message_to_delete_dict(list_msg)
 
             await state.update_data(list_msg=(list_msg.chat.id, list_msg.message_id))
 
@@ -1351,6 +1328,18 @@ async def photo_test(
     print("*" * 10)
 
 
+@main_router.message(Command("respread_jobs"), F.from_user.id.in_(config.ADMIN_IDS))
+async def respread_jobs_command(message: types.Message, redis_pool: ArqRedis):
+    await redis_pool.enqueue_job(
+        "respread_scheduler_jobs",
+        _queue_name="arq:low",
+        _job_id="respread_scheduler_jobs",
+    )
+    await message.answer(
+        text="Задачи будут перераспределены, результат придёт в чат админов"
+    )
+
+
 @main_router.message(
     F.content_type == types.ContentType.DOCUMENT,
     F.from_user.id.in_(config.ADMIN_IDS),
@@ -1423,7 +1412,7 @@ async def any_input(
     else:
         sub_active_msg = await message.answer(text="Невалидная ссылка")
 
-    await add_message_to_delete_dict(sub_active_msg, state)
+    await add_message_to_delete_dict(sub_active_msg)
 
     await state.update_data(
         _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
@@ -184,7 +184,7 @@ async def add_punkt_proccess(
             sub_active_msg: types.Message = await message.answer(
                 "Возникли трудности, попробуйте еще раз"
             )
-            await add_message_to_delete_dict(sub_active_msg, state)
+            await add_message_to_delete_dict(sub_active_msg)
             await state.update_data(
                 _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
             )
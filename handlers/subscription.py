@@ -173,7 +173,7 @@ async def get_subscription_handler(
             parse_mode="markdown",
         )
 
-        await add_message_to_delete_dict(subscription_msg, state)
+        await add_message_to_delete_dict(subscription_msg)
 
         await state.update_data(
             subscription_msg=(subscription_msg.chat.id, subscription_msg.message_id)
@@ -13,17 +13,22 @@ from db.base import engine, session, Base
 
 from middlewares.db import DbSessionMiddleware
 
+from utils.leader import start_scheduler, stop_leader_election
 from utils.pics import ImageManager
 from utils.storage import storage
+from utils.update_dispatcher import UpdateDispatcher
 from utils.scheduler import (
     scheduler,
     setup_subscription_end_job,
     sync_popular_product_jobs,
     setup_subscription_is_about_to_end_job,
     setup_messages_sendigns_job,
+    setup_product_price_checks_job,
+    restore_user_product_jobs,
 )
 
 from payments.yoomoney import yoomoney_payment_notification_handler
+from services.http_session import close_http_session
 from deps import YoomoneyServiceDep
 
 import config
@@ -49,6 +54,8 @@ dp.include_router(payments_router)
 dp.include_router(punkt_router)
 dp.include_router(main_router)
 
+update_dispatcher = UpdateDispatcher(dp, bot, config.UPDATES_CONCURRENCY)
+
 
 # #Add session and database connection in handlers
 
@@ -92,7 +99,7 @@ async def on_startup():
 
     redis_pool = await get_redis_background_pool()
     image_manager = ImageManager(bot)
-    scheduler.start()
+    await start_scheduler(scheduler)
 
     dp.update.middleware(
         DbSessionMiddleware(
@@ -107,24 +114,31 @@ async def on_startup():
     asyncio.create_task(setup_subscription_end_job(scheduler))
     asyncio.create_task(setup_subscription_is_about_to_end_job(scheduler))
     asyncio.create_task(setup_messages_sendigns_job(scheduler))
+    asyncio.create_task(setup_product_price_checks_job(scheduler))
+    asyncio.create_task(restore_user_product_jobs(scheduler))
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     await bot.delete_webhook(drop_pending_updates=True)
+    await update_dispatcher.close(config.UPDATES_SHUTDOWN_TIMEOUT_SECONDS)
+    await stop_leader_election()
     try:
         scheduler.shutdown()
     except Exception as ex:
         print(ex)
 
+    await close_http_session()
+
 
 # #Endpoint for incoming updates
 @app.post(WEBHOOK_PATH)
 async def bot_webhook(update: dict):
     # print("UPDATE FROM TG", update)
-    tg_update = types.Update(**update)
+    tg_update = types.Update.model_validate(update, context={"bot": bot})
     # print('TG UPDATE', tg_update, tg_update.__dict__)
-    await dp.feed_update(bot=bot, update=tg_update)
+    # отвечаем Telegram сразу, апдейт обработается в фоне
+    update_dispatcher.submit(tg_update)
 
 
 @app.post("/payments/yoomoney_payment_notification")
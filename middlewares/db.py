@@ -1,3 +1,4 @@
+import inspect
 from typing import Callable, Awaitable, Dict, Any
 
 from arq.connections import ArqRedis
@@ -7,11 +8,71 @@ from aiogram.types import TelegramObject
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession, async_sessionmaker
 
 from utils.pics import ImageManager
 
 
+class LazySession:
+    """Сессия БД на время обработки одного апдейта.
+
+    Соединение берётся из пула при первом запросе к БД и держится до конца
+    апдейта, в том числе между commit. `async with session` в обработчиках
+    сессию не закрывает - это делает DbSessionMiddleware, зафиксировав
+    оставшиеся изменения. Апдейты без обращений к БД соединение не берут
+    """
+
+    def __init__(self, session_pool: async_sessionmaker):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+        self._connection: AsyncConnection | None = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = self._session_pool()
+
+        attr = getattr(self._session, name)
+        if self._connection is not None or not inspect.iscoroutinefunction(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            await self._connect()
+            return await attr(*args, **kwargs)
+
+        return call
+
+    async def _connect(self):
+        if self._connection is not None:
+            return
+
+        self._connection = await self._session.bind.connect()
+        # транзакция ещё не начата, поэтому сессию можно перепривязать
+        self._session.bind = self._connection
+        self._session.sync_session.bind = self._connection.sync_connection
+
+    async def release(self, commit: bool):
+        if self._session is None:
+            return
+
+        try:
+            if self._session.in_transaction():
+                if commit:
+                    await self._session.commit()
+                else:
+                    await self._session.rollback()
+        finally:
+            await self._session.close()
+            if self._connection is not None:
+                await self._connection.close()
+            self._session = self._connection = None
+
+
 class DbSessionMiddleware(BaseMiddleware):
     def __init__(
         self,
@@ -32,12 +93,18 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-
-        async with self.session_pool() as session:
-            data["session"] = session
+        session = LazySession(self.session_pool)
+        data["session"] = session
 
         data["scheduler"] = self.scheduler
         data["redis_pool"] = self.redis_pool
         data["image_manager"] = self.image_manager
 
-        return await handler(event, data)
+        try:
+            result = await handler(event, data)
+        except BaseException:
+            await session.release(commit=False)
+            raise
+
+        await session.release(commit=True)
+        return result
@@ -1,6 +1,7 @@
 from datetime import date, datetime, timedelta, timezone
 
 
+from background.base import get_redis_background_pool
 from db.base import User, UserSubscription
 from db.repository.user import UserRepository
 from db.repository.user_subscription import UserSubscriptionRepository
@@ -17,6 +18,15 @@ async def set_subscription_to_user_if_needed(
             user.tg_id, subscription_id=user_subscription.subscription_id
         )
 
+        # интервал проверки цен зависит от подписки
+        redis_pool = await get_redis_background_pool()
+        await redis_pool.enqueue_job(
+            "reschedule_user_jobs",
+            user.tg_id,
+            _queue_name="arq:low",
+            _job_id=f"reschedule_user_jobs_{user.tg_id}",
+        )
+
 
 async def give_user_subscription(
     us_repo: UserSubscriptionRepository,
@@ -0,0 +1,107 @@
+from redis.exceptions import RedisError
+
+import config
+from logger import logger
+from utils.exc import CircuitOpenError
+from utils.storage import redis_client
+
+# Сбрасывает состояние, только если есть ошибки или предохранитель
+# размыкался: обычный успешный запрос обходится одним чтением
+_RESET_SCRIPT = """
+if redis.call('EXISTS', KEYS[1], KEYS[2]) > 0 then
+    return redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+end
+return 0
+"""
+
+_reset_script = redis_client.register_script(_RESET_SCRIPT)
+
+
+class CircuitBreaker:
+    """Общий для всех воркеров предохранитель запросов к API маркетплейса.
+
+    После API_CIRCUIT_FAILURE_THRESHOLD ошибок подряд за окно запросы на
+    API_CIRCUIT_OPEN_SECONDS сразу падают с CircuitOpenError. Затем пропускается
+    один пробный запрос: успех закрывает предохранитель, ошибка снова размыкает
+    """
+
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.failures_key = f"circuit:{backend}:failures"
+        self.open_key = f"circuit:{backend}:open"
+        self.tripped_key = f"circuit:{backend}:tripped"
+        self.probe_key = f"circuit:{backend}:probe"
+
+    async def is_open(self) -> bool:
+        try:
+            return bool(await redis_client.exists(self.open_key))
+        except RedisError:
+            logger.warning("Can't check circuit %s", self.backend, exc_info=True)
+            return False
+
+    async def before_request(self):
+        try:
+            is_open, tripped = await redis_client.mget(self.open_key, self.tripped_key)
+            if is_open:
+                raise CircuitOpenError(self.backend)
+
+            # полуоткрытое состояние - пропускаем только один пробный запрос
+            if tripped and not await redis_client.set(
+                self.probe_key, 1, nx=True, ex=config.API_SERVICES_TIMEOUT + 5
+            ):
+                raise CircuitOpenError(self.backend)
+        except RedisError:
+            logger.warning("Can't check circuit %s", self.backend, exc_info=True)
+
+    async def record_success(self):
+        try:
+            await _reset_script(
+                keys=[self.failures_key, self.tripped_key, self.probe_key]
+            )
+        except RedisError:
+            logger.warning("Can't close circuit %s", self.backend, exc_info=True)
+
+    async def record_failure(self):
+        try:
+            if await redis_client.exists(self.tripped_key):
+                await self.__open()
+                return
+
+            failures = await redis_client.incr(self.failures_key)
+            if failures == 1:
+                await redis_client.expire(
+                    self.failures_key, config.API_CIRCUIT_FAILURE_WINDOW_SECONDS
+                )
+
+            if failures >= config.API_CIRCUIT_FAILURE_THRESHOLD:
+                await self.__open()
+        except RedisError:
+            logger.warning(
+                "Can't record circuit %s failure", self.backend, exc_info=True
+            )
+
+    async def __open(self):
+        logger.warning(
+            "Circuit %s is open for %s seconds",
+            self.backend,
+            config.API_CIRCUIT_OPEN_SECONDS,
+        )
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(self.open_key, 1, ex=config.API_CIRCUIT_OPEN_SECONDS)
+            # полуоткрытое состояние не дольше одного пробного запроса,
+            # чтобы предохранитель не мог в нём застрять
+            pipe.set(
+                self.tripped_key,
+                1,
+                ex=config.API_CIRCUIT_OPEN_SECONDS + config.API_SERVICES_TIMEOUT + 5,
+            )
+            pipe.delete(self.failures_key, self.probe_key)
+            await pipe.execute()
+
+
+ozon_circuit_breaker = CircuitBreaker("ozon")
+wb_circuit_breaker = CircuitBreaker("wb")
+
+
+def get_circuit_breaker(marker: str) -> CircuitBreaker:
+    return ozon_circuit_breaker if marker == "ozon" else wb_circuit_breaker
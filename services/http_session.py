@@ -0,0 +1,30 @@
+import aiohttp
+
+import config
+
+_http_session: aiohttp.ClientSession | None = None
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Общая для процесса сессия с пулом соединений к API маркетплейсов"""
+    global _http_session
+
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=config.API_SERVICES_CONNECTIONS_LIMIT,
+            limit_per_host=config.API_SERVICES_CONNECTIONS_LIMIT_PER_HOST,
+            keepalive_timeout=config.API_SERVICES_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.API_SERVICES_DNS_CACHE_TTL,
+        )
+        _http_session = aiohttp.ClientSession(connector=connector)
+
+    return _http_session
+
+
+async def close_http_session():
+    global _http_session
+
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+    _http_session = None
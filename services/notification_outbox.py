@@ -0,0 +1,48 @@
+import json
+
+from aiogram.types import InlineKeyboardMarkup
+
+from utils.storage import redis_client
+
+# Очередь уведомлений пользователям и в каналы (Redis stream). Задачи только
+# добавляют сообщения, отправляет их background.notification_sender
+# с учётом лимитов Telegram
+OUTBOX_KEY = "notifications:outbox"
+OUTBOX_GROUP = "sender"
+# Ограничение длины stream на случай, если отправитель долго не работает
+OUTBOX_MAX_LENGTH = 100_000
+
+
+async def enqueue_notification(
+    chat_id: int | str,
+    text: str,
+    photo_id: str | None = None,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    disable_notification: bool = False,
+    delete_later: bool = False,
+    user_product_id: int | None = None,
+    price: float | None = None,
+):
+    """Ставит сообщение в очередь на отправку.
+
+    delete_later - удалить сообщение вместе со старыми сообщениями пользователя.
+    user_product_id, price - после доставки записать price в last_send_price
+    товара пользователя"""
+    data = {
+        "chat_id": chat_id,
+        "text": text,
+        "photo_id": photo_id,
+        "reply_markup": (
+            reply_markup.model_dump(exclude_none=True) if reply_markup else None
+        ),
+        "disable_notification": disable_notification,
+        "delete_later": delete_later,
+        "user_product_id": user_product_id,
+        "price": price,
+    }
+    await redis_client.xadd(
+        OUTBOX_KEY,
+        {"data": json.dumps(data, ensure_ascii=False)},
+        maxlen=OUTBOX_MAX_LENGTH,
+        approximate=True,
+    )
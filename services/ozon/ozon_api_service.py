@@ -2,9 +2,18 @@ import json
 import re
 import aiohttp
 
-from utils.exc import OzonAPICrashError, OzonAPIAttemptsExceeded, OzonAPIParseError
+from utils.exc import (
+    CircuitOpenError,
+    OzonAPICrashError,
+    OzonAPIAttemptsExceeded,
+    OzonAPIParseError,
+)
 import config
 
+from services.circuit_breaker import ozon_circuit_breaker
+from services.http_session import get_http_session
+from services.rate_limiter import ozon_rate_limiter
+from services.single_flight import single_flight
 from services.ozon.dto import ProductDTO
 
 
@@ -22,6 +31,8 @@ class OzonAPIService:
         while attempt < 4:
             try:
                 return await self.__make_get_response(url)
+            except CircuitOpenError:
+                raise
             except Exception:
                 attempt += 1
                 if attempt > 3:
@@ -34,22 +45,41 @@ class OzonAPIService:
         return await self.__make_get_response(url)
 
     async def __make_get_response(self, url: str) -> str:
+        return await single_flight(url, lambda: self.__fetch(url))
+
+    async def __fetch(self, url: str) -> str:
+        await ozon_circuit_breaker.before_request()
+        await ozon_rate_limiter.acquire()
+
         timeout = aiohttp.ClientTimeout(total=config.API_SERVICES_TIMEOUT)
-        async with aiohttp.ClientSession() as aiosession:
-            try:
-                async with aiosession.get(url=url, timeout=timeout) as response:
-                    _status_code = response.status
-                    print(f"OZON RESPONSE CODE {_status_code}")
-
-                    if _status_code != 200:
-                        _text = await response.text()
-                        raise OzonAPICrashError(
-                            f"Status code is not 200 {_status_code}. Text: {_text}"
-                        )
-
-                    return await response.text()
-            except TimeoutError as e:
-                raise OzonAPICrashError("API timeout occured") from e
+        aiosession = await get_http_session()
+        try:
+            async with aiosession.get(url=url, timeout=timeout) as response:
+                _status_code = response.status
+                print(f"OZON RESPONSE CODE {_status_code}")
+
+                if _status_code != 200:
+                    _text = await response.text()
+                    if _status_code >= 500 or _status_code == 429:
+                        await ozon_circuit_breaker.record_failure()
+                    else:
+                        # API отвечает, ошибка в самом запросе
+                        await ozon_circuit_breaker.record_success()
+
+                    raise OzonAPICrashError(
+                        f"Status code is not 200 {_status_code}. Text: {_text}"
+                    )
+
+                text = await response.text()
+        except TimeoutError as e:
+            await ozon_circuit_breaker.record_failure()
+            raise OzonAPICrashError("API timeout occured") from e
+        except aiohttp.ClientError:
+            await ozon_circuit_breaker.record_failure()
+            raise
+
+        await ozon_circuit_breaker.record_success()
+        return text
 
     def parse_product_data_old(self, raw_data: str) -> ProductDTO:
         short_link = raw_data.split("|")[0]
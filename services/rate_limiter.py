@@ -0,0 +1,100 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from enum import Enum
+
+from redis.exceptions import RedisError
+
+import config
+from logger import logger
+from utils.storage import redis_client
+
+
+class RequestPriority(Enum):
+    INTERACTIVE = "interactive"
+    BACKGROUND = "background"
+
+
+# Приоритет запросов к API в текущей задаче. Каждая arq задача выполняется
+# в своём asyncio таске, поэтому значение не протекает в другие задачи
+request_priority: ContextVar[RequestPriority] = ContextVar(
+    "request_priority", default=RequestPriority.BACKGROUND
+)
+
+
+# Token bucket: пополняется со скоростью rate токенов в секунду до capacity.
+# Фоновые запросы не могут опустить бакет ниже reserve - этот остаток
+# доступен только интерактивным. Возвращает сколько секунд подождать (0 - взяли токен)
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+
+return tostring(wait)
+"""
+
+_acquire_script = redis_client.register_script(_ACQUIRE_SCRIPT)
+
+
+class RateLimiter:
+    """Общий для всех воркеров лимит запросов к API маркетплейса или Telegram"""
+
+    def __init__(
+        self,
+        backend: str,
+        rate: float,
+        capacity: int,
+        reserved_share: float = config.API_INTERACTIVE_RESERVED_SHARE,
+    ):
+        self.key = f"rate_limit:{backend}"
+        self.rate = rate
+        self.capacity = capacity
+        # доля бакета, доступная только интерактивным запросам
+        self.reserved_share = reserved_share
+
+    async def acquire(self):
+        if request_priority.get() == RequestPriority.INTERACTIVE:
+            reserve = 0
+        else:
+            reserve = self.capacity * self.reserved_share
+
+        while True:
+            try:
+                wait = float(
+                    await _acquire_script(
+                        keys=[self.key],
+                        args=[self.rate, self.capacity, reserve, time.time()],
+                    )
+                )
+            except RedisError:
+                # без Redis не блокируем запросы к API
+                logger.warning("Can't acquire rate limit %s", self.key, exc_info=True)
+                return
+
+            if wait <= 0:
+                return
+
+            await asyncio.sleep(wait)
+
+
+ozon_rate_limiter = RateLimiter(
+    "ozon", config.OZON_API_RATE_PER_SECOND, config.OZON_API_BURST
+)
+wb_rate_limiter = RateLimiter("wb", config.WB_API_RATE_PER_SECOND, config.WB_API_BURST)
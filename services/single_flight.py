@@ -0,0 +1,27 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+async def single_flight(key: str, func: Callable[[], Awaitable[T]]) -> T:
+    """Одновременные вызовы с одним ключом ждут один и тот же запрос.
+    Отмена одного из ожидающих не отменяет запрос для остальных"""
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(func())
+        _in_flight[key] = task
+        task.add_done_callback(lambda t: __forget(key, t))
+
+    return await asyncio.shield(task)
+
+
+def __forget(key: str, task: asyncio.Task):
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+
+    # исключение могло остаться без ожидающих, если их всех отменили
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,53 @@
+import asyncio
+
+import config
+from services.rate_limiter import RateLimiter
+from utils.storage import redis_client
+
+# Общие для всех процессов лимиты отправки сообщений ботом
+PAUSE_KEY = "telegram:pause"
+
+# без резерва: отправитель уведомлений работает с фоновым приоритетом,
+# интерактивных запросов к этому бакету нет
+telegram_rate_limiter = RateLimiter(
+    "telegram",
+    config.TELEGRAM_RATE_PER_SECOND,
+    int(config.TELEGRAM_RATE_PER_SECOND),
+    reserved_share=0,
+)
+
+
+def is_user_chat(chat_id: int | str) -> bool:
+    # каналы хранятся строками, у групп и каналов отрицательные id
+    return isinstance(chat_id, int) and chat_id > 0
+
+
+async def pause_sending(seconds: int):
+    """Приостанавливает отправку всеми процессами, например по TelegramRetryAfter"""
+    # Telegram может прислать retry_after=0, а EX должен быть положительным
+    await redis_client.set(PAUSE_KEY, 1, ex=max(int(seconds), 1))
+
+
+async def wait_for_pause():
+    while (ttl := await redis_client.pttl(PAUSE_KEY)) > 0:
+        await asyncio.sleep(ttl / 1000)
+
+
+async def wait_for_chat(chat_id: int | str):
+    """Ждёт, пока в чат можно будет отправить следующее сообщение"""
+    if is_user_chat(chat_id):
+        interval = config.TELEGRAM_CHAT_INTERVAL_MS
+    else:
+        interval = config.TELEGRAM_GROUP_CHAT_INTERVAL_MS
+
+    key = f"telegram:chat:{chat_id}"
+    while not await redis_client.set(key, 1, nx=True, px=interval):
+        ttl = await redis_client.pttl(key)
+        await asyncio.sleep(max(ttl, 10) / 1000)
+
+
+async def wait_for_send_slot(chat_id: int | str):
+    """Ждёт общего лимита бота и лимита чата перед отправкой сообщения"""
+    await wait_for_pause()
+    await wait_for_chat(chat_id)
+    await telegram_rate_limiter.acquire()
@@ -2,6 +2,10 @@ import base64
 import json
 import aiohttp
 
+from services.circuit_breaker import wb_circuit_breaker
+from services.http_session import get_http_session
+from services.rate_limiter import wb_rate_limiter
+from services.single_flight import single_flight
 from services.wb.dto import ProductDTO
 from utils.exc import WbAPICrashError
 import config
@@ -13,6 +17,23 @@ class WbAPIService:
         url = f"{config.WB_API_URL}/product/{del_zone}/{short_link}"
         return json.loads(await self.__make_get_response(url))
 
+    async def get_products_data(
+        self, short_links: list[str], del_zone: str
+    ) -> dict[str, ProductDTO]:
+        """Получает цены сразу нескольких товаров одной зоны доставки.
+        Артикулы запрашиваются пачками по config.WB_PRODUCTS_BATCH_SIZE,
+        товары без цены в результат не попадают"""
+        products_data: dict[str, ProductDTO] = {}
+        batch_size = config.WB_PRODUCTS_BATCH_SIZE
+
+        for i in range(0, len(short_links), batch_size):
+            ids = ";".join(short_links[i : i + batch_size])
+            url = f"{config.WB_API_URL}/product/{del_zone}/{ids}"
+            res = json.loads(await self.__make_get_response(url))
+            products_data.update(self.parse_products_data(res))
+
+        return products_data
+
     async def get_delivery_zone(self, city_index: str) -> str:
         url = f"{config.WB_API_URL}/pickUpPoint/{city_index}"
         return await self.__make_get_response(url)
@@ -23,27 +44,63 @@ class WbAPIService:
         return base64.b64decode(image_str)
 
     async def __make_get_response(self, url: str) -> str:
-        timeout = aiohttp.ClientTimeout(total=config.API_SERVICES_TIMEOUT)
-        async with aiohttp.ClientSession() as aiosession:
-            try:
-                async with aiosession.get(url=url, timeout=timeout) as response:
-                    _status_code = response.status
-                    print(f"WB RESPONSE CODE {_status_code}")
+        return await single_flight(url, lambda: self.__fetch(url))
 
-                    if _status_code != 200:
-                        _text = await response.text()
-                        raise WbAPICrashError(
-                            f"Status code is not 200 {_status_code}. Text: {_text}"
-                        )
+    async def __fetch(self, url: str) -> str:
+        await wb_circuit_breaker.before_request()
+        await wb_rate_limiter.acquire()
 
-                    return await response.text()
-            except TimeoutError as e:
-                raise WbAPICrashError("Timeout api") from e
+        timeout = aiohttp.ClientTimeout(total=config.API_SERVICES_TIMEOUT)
+        aiosession = await get_http_session()
+        try:
+            async with aiosession.get(url=url, timeout=timeout) as response:
+                _status_code = response.status
+                print(f"WB RESPONSE CODE {_status_code}")
+
+                if _status_code != 200:
+                    _text = await response.text()
+                    if _status_code >= 500 or _status_code == 429:
+                        await wb_circuit_breaker.record_failure()
+                    else:
+                        # API отвечает, ошибка в самом запросе
+                        await wb_circuit_breaker.record_success()
+
+                    raise WbAPICrashError(
+                        f"Status code is not 200 {_status_code}. Text: {_text}"
+                    )
+
+                text = await response.text()
+        except TimeoutError as e:
+            await wb_circuit_breaker.record_failure()
+            raise WbAPICrashError("Timeout api") from e
+        except aiohttp.ClientError:
+            await wb_circuit_breaker.record_failure()
+            raise
+
+        await wb_circuit_breaker.record_success()
+        return text
 
     def parse_product_data(self, data: dict):
         d = data.get("data")
 
-        sizes = d.get("products")[0].get("sizes")
+        return self.__parse_product_prices(d.get("products")[0])
+
+    def parse_products_data(self, data: dict) -> dict[str, ProductDTO]:
+        products_data: dict[str, ProductDTO] = {}
+
+        for product in data.get("data").get("products"):
+            try:
+                products_data[str(product.get("id"))] = self.__parse_product_prices(
+                    product
+                )
+            except ValueError:
+                # у товара нет ни одного размера с ценой (нет в наличии)
+                continue
+
+        return products_data
+
+    def __parse_product_prices(self, product: dict) -> ProductDTO:
+        sizes = product.get("sizes")
 
         basic_price = product_price = None
 
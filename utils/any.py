@@ -1,11 +1,9 @@
-import json
 import csv
 from datetime import datetime
 
 import aiohttp
 
 from aiogram import types
-from aiogram.fsm.context import FSMContext
 
 from utils.storage import redis_client
 from config import COUNTER_ID, YANDEX_TOKEN
@@ -57,53 +55,25 @@ def generate_sale_for_price_popular_product(price: float):
     return _sale
 
 
-async def add_message_to_delete_dict(message: types.Message, state: FSMContext = None):
-    chat_id = message.chat.id
-    message_date = message.date.timestamp()
-    message_id = message.message_id
+# Сообщения пользователя, которые periodic_delete_old_message удалит позже:
+# sorted set "{chat_id}:{message_id}" со score - временем отправки сообщения.
+# Старше 48 часов бот сообщения удалить уже не может, поэтому и ключ не нужен
+MESSAGES_ON_DELETE_TTL_SECONDS = 48 * 60 * 60
 
-    # test on myself
-    # if chat_id in (int(DEV_ID), 311364517):
-    if state is not None:
-        data = await state.get_data()
 
-        dict_msg_on_delete: dict = data.get("dict_msg_on_delete")
+def messages_on_delete_key(user_id: int) -> str:
+    return f"messages_on_delete:{user_id}"
 
-        if not dict_msg_on_delete:
-            dict_msg_on_delete = dict()
 
-        dict_msg_on_delete[message_id] = (chat_id, message_date)
-
-        await state.update_data(dict_msg_on_delete=dict_msg_on_delete)
-        return
+async def add_message_to_delete_dict(message: types.Message):
+    key = messages_on_delete_key(message.chat.id)
+    member = f"{message.chat.id}:{message.message_id}"
 
     try:
-        user_id = message.chat.id
-        key = f"fsm:{user_id}:{user_id}:data"
-
-        async with redis_client.pipeline(transaction=True) as pipe:
-            user_data: bytes = await pipe.get(key)
-            results = await pipe.execute()
-            # Извлекаем результат из выполненного pipeline
-        # print('RESULTS', results)
-        # print('USER DATA (BYTES)', user_data)
-
-        json_user_data: dict = json.loads(results[0])
-        # print('USER DATA', json_user_data)
-
-        dict_msg_on_delete: dict = json_user_data.get("dict_msg_on_delete")
-
-        if not dict_msg_on_delete:
-            dict_msg_on_delete = dict()
-
-        dict_msg_on_delete[message_id] = (chat_id, message_date)
-
-        json_user_data["dict_msg_on_delete"] = dict_msg_on_delete
-
-        async with redis_client.pipeline(transaction=True) as pipe:
-            bytes_data = json.dumps(json_user_data)
-            await pipe.set(key, bytes_data)
-            results = await pipe.execute()
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {member: message.date.timestamp()})
+            pipe.expire(key, MESSAGES_ON_DELETE_TTL_SECONDS)
+            await pipe.execute()
     except Exception as ex:
         print("ERROR WITH TRY ADD SCHEDULER MESSAGE TO REDIS STORE", ex)
 
@@ -18,6 +18,10 @@ class WbAPICrashError(Exception):
     pass
 
 
+class CircuitOpenError(Exception):
+    pass
+
+
 class WbProductExistsError(Exception):
     pass
 
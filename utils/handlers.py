@@ -12,7 +12,7 @@ import pytz
 
 import plotly.graph_objects as go
 
-from sqlalchemy import update, select, and_, insert, Subquery, func
+from sqlalchemy import Row, update, select, and_, insert, Subquery, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot22 import bot
@@ -32,6 +32,7 @@ from db.repository.product_city_graphic import ProductCityGraphicRepository
 from db.repository.punkt import PunktRepository
 from db.repository.subscription import SubscriptionRepository
 from db.repository.user import UserRepository
+from db.repository.user_product import UserProductRepository
 from db.repository.user_subscription import UserSubscriptionRepository
 from db.repository.utm import UTMRepository
 from payments.notifications import notify_user_about_referal_free_subscription
@@ -40,9 +41,14 @@ from schemas import MessageInfo
 from utils.pics import ImageManager
 
 from utils.exc import NotEnoughGraphicData
-from utils.scheduler import add_task_to_delete_old_message_for_users
+from utils.scheduler import (
+    add_task_to_delete_old_message_for_users,
+    resume_user_product_jobs,
+    scheduler,
+)
 
-from utils.any import send_data_to_yandex_metica
+from utils.any import add_message_to_delete_dict, send_data_to_yandex_metica
+from utils.user_cache import is_known_active, remember_active
 
 from keyboards import (
     create_back_to_product_btn,
@@ -62,6 +68,8 @@ image_manager = ImageManager(bot)
 async def state_clear(state: FSMContext):
     data = await state.get_data()
 
+    # старый формат списка сообщений на удаление, его переносит в Redis
+    # periodic_delete_old_message
     dict_msg_on_delete: dict = data.get("dict_msg_on_delete")
 
     await state.clear()
@@ -70,25 +78,6 @@ async def state_clear(state: FSMContext):
         await state.update_data(dict_msg_on_delete=dict_msg_on_delete)
 
 
-async def add_message_to_delete_dict(message: types.Message, state: FSMContext):
-    chat_id = message.chat.id
-    message_date = message.date.timestamp()
-    message_id = message.message_id
-
-    # test on myself
-    # if chat_id in (int(DEV_ID), 311364517):
-    data = await state.get_data()
-
-    dict_msg_on_delete: dict = data.get("dict_msg_on_delete")
-
-    if not dict_msg_on_delete:
-        dict_msg_on_delete = dict()
-
-    dict_msg_on_delete[message_id] = (chat_id, message_date)
-
-    await state.update_data(dict_msg_on_delete=dict_msg_on_delete)
-
-
 def check_input_link(link: str):
     if (
         (link.startswith("https://ozon"))
@@ -286,7 +275,7 @@ async def generate_graphic(
         reply_markup=_kb.as_markup(),
     )
 
-    await add_message_to_delete_dict(photo_msg, state)
+    await add_message_to_delete_dict(photo_msg)
 
     if photo_msg.photo:
         photo_id = photo_msg.photo[0].file_id
@@ -361,14 +350,26 @@ async def add_user(
 async def check_user(
     message: types.Message, session: AsyncSession, utm_source: str | None
 ):
+    user_id = message.from_user.id
+    if await is_known_active(user_id):
+        return True
+
     async with session as _session:
         repo = UserRepository(_session)
-        user = await repo.find_by_id(message.from_user.id)
+        user = await repo.find_by_id(user_id)
         if user:
-            await repo.update_old(user.tg_id, is_active=True)
+            if not user.is_active:
+                await repo.update_old(user.tg_id, is_active=True)
+                # пользователь вернулся - возобновляем проверку цен его товаров
+                await resume_user_product_jobs(scheduler, user.tg_id, _session)
+            await remember_active(user_id)
             return True
 
-        return await add_user(message, _session, utm_source)
+        if not await add_user(message, _session, utm_source):
+            return False
+
+    await remember_active(user_id)
+    return True
 
 
 async def handle_referal_invitation(
@@ -488,33 +489,75 @@ async def get_users_punkt_city(user_id: int, session: AsyncSession) -> str | Non
 
 
 # new
-async def new_show_product_list(product_dict: dict, user_id: int, state: FSMContext):
+async def new_show_product_list(
+    product_dict: dict,
+    user_id: int,
+    state: FSMContext,
+    session: AsyncSession,
+    move: str | None = None,
+):
+    """Показывает страницу current_page списка товаров.
+
+    В product_dict хранятся только количества товаров и ключи первого и
+    последнего товара показанной страницы: с move="next"/"prev" соседняя
+    страница выбирается по ключу, иначе - по номеру страницы"""
     data = await state.get_data()
 
     current_page = product_dict.get("current_page")
-    product_list = product_dict.get("product_list")
     len_product_list = product_dict.get("len_product_list")
     wb_product_count = product_dict.get("wb_product_count")
     ozon_product_count = product_dict.get("ozon_product_count")
+    page_bounds = product_dict.get("page_bounds")
 
     list_msg: tuple = product_dict.get("list_msg")
 
-    if not product_list:
+    product_list_for_page = []
+    if len_product_list:
+        async with session as _session:
+            repo = UserProductRepository(_session)
+            if move == "next" and page_bounds:
+                product_list_for_page = await repo.get_list_page(
+                    user_id,
+                    DEFAULT_PAGE_ELEMENT_COUNT,
+                    after=__decode_page_key(page_bounds[-1]),
+                )
+            elif move == "prev" and page_bounds:
+                product_list_for_page = await repo.get_list_page(
+                    user_id,
+                    DEFAULT_PAGE_ELEMENT_COUNT,
+                    before=__decode_page_key(page_bounds[0]),
+                )
+
+            if not product_list_for_page:
+                product_list_for_page = await repo.get_list_page(
+                    user_id,
+                    DEFAULT_PAGE_ELEMENT_COUNT,
+                    offset=(current_page - 1) * DEFAULT_PAGE_ELEMENT_COUNT,
+                )
+
+            # товары удалили, пока список был открыт
+            if not product_list_for_page and current_page > 1:
+                current_page = product_dict["current_page"] = 1
+                product_list_for_page = await repo.get_list_page(
+                    user_id, DEFAULT_PAGE_ELEMENT_COUNT
+                )
+
+    if not product_list_for_page:
         await delete_prev_subactive_msg(data)
         sub_active_msg = await bot.send_message(
             chat_id=user_id, text="Нет добавленных товаров"
         )
-        await add_message_to_delete_dict(sub_active_msg, state)
+        await add_message_to_delete_dict(sub_active_msg)
 
         await state.update_data(
             _add_msg=(sub_active_msg.chat.id, sub_active_msg.message_id)
         )
         return
 
-    start_idx = (current_page - 1) * DEFAULT_PAGE_ELEMENT_COUNT
-    end_idx = current_page * DEFAULT_PAGE_ELEMENT_COUNT
-
-    product_list_for_page = product_list[start_idx:end_idx]
+    product_dict["page_bounds"] = [
+        __encode_page_key(product_list_for_page[0]),
+        __encode_page_key(product_list_for_page[-1]),
+    ]
 
     _kb = new_create_product_list_for_page_kb(product_list_for_page)
     _kb = new_add_pagination_btn(_kb, product_dict)
@@ -544,7 +587,7 @@ async def new_show_product_list(product_dict: dict, user_id: int, state: FSMCont
             reply_markup=_kb.as_markup(),
         )
 
-        await add_message_to_delete_dict(list_msg, state)
+        await add_message_to_delete_dict(list_msg)
 
         product_dict["list_msg"] = (list_msg.chat.id, list_msg.message_id)
 
@@ -568,6 +611,15 @@ async def new_show_product_list(product_dict: dict, user_id: int, state: FSMCont
     await state.update_data(view_product_dict=product_dict)
 
 
+def __encode_page_key(product: Row) -> list:
+    return [product.time_create.isoformat(), product.id]
+
+
+def __decode_page_key(key: list) -> tuple[datetime, int]:
+    time_create, product_id = key
+    return datetime.fromisoformat(time_create), product_id
+
+
 async def try_delete_prev_list_msgs(chat_id: int, state: FSMContext):
     data = await state.get_data()
 
@@ -0,0 +1,16 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+# Точка отсчёта фаз: задача с фазой phase запускается в SPREAD_EPOCH + phase + k * период
+SPREAD_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def get_phase_seconds(key: str, period_seconds: int) -> int:
+    """Детерминированное смещение в пределах периода по хэшу ключа,
+    чтобы задачи, созданные одновременно, не запускались одновременно"""
+    digest = hashlib.md5(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % max(period_seconds, 1)
+
+
+def get_spread_start_date(key: str, period_seconds: int) -> datetime:
+    return SPREAD_EPOCH + timedelta(seconds=get_phase_seconds(key, period_seconds))
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import socket
+from uuid import uuid4
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+from redis.exceptions import RedisError
+
+import config
+from logger import logger
+from utils.storage import redis_client
+
+LEADER_KEY = "scheduler:leader"
+
+# Продлевает аренду, только если лидер всё ещё мы
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_renew_script = redis_client.register_script(_RENEW_SCRIPT)
+_release_script = redis_client.register_script(_RELEASE_SCRIPT)
+
+_token = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex}"
+_election_task: asyncio.Task | None = None
+_is_leader = False
+
+
+async def start_scheduler(scheduler: AsyncIOScheduler):
+    """Запускает планировщик. С SCHEDULER_LEADER_ELECTION задачи выполняет
+    только процесс, владеющий арендой в Redis, остальные запускают планировщик
+    на паузе и используют его только для добавления и удаления задач"""
+    global _election_task
+
+    if not config.SCHEDULER_LEADER_ELECTION:
+        scheduler.start()
+        return
+
+    scheduler.start(paused=True)
+    _election_task = asyncio.create_task(__run_election(scheduler))
+
+
+async def stop_leader_election():
+    global _election_task, _is_leader
+
+    if _election_task is None:
+        return
+
+    _election_task.cancel()
+    _election_task = None
+
+    if _is_leader:
+        _is_leader = False
+        try:
+            await _release_script(keys=[LEADER_KEY], args=[_token])
+        except RedisError:
+            logger.warning("Can't release scheduler leadership", exc_info=True)
+
+
+async def __run_election(scheduler: AsyncIOScheduler):
+    while True:
+        try:
+            await __elect(scheduler)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.error("Error in scheduler leader election", exc_info=True)
+
+        await asyncio.sleep(config.SCHEDULER_LEADER_LEASE_SECONDS / 3)
+
+
+async def __elect(scheduler: AsyncIOScheduler):
+    global _is_leader
+
+    lease_ms = config.SCHEDULER_LEADER_LEASE_SECONDS * 1000
+    try:
+        if _is_leader:
+            has_lease = bool(
+                await _renew_script(keys=[LEADER_KEY], args=[_token, lease_ms])
+            )
+        else:
+            has_lease = bool(
+                await redis_client.set(LEADER_KEY, _token, nx=True, px=lease_ms)
+            )
+    except RedisError:
+        logger.warning("Can't renew scheduler leadership", exc_info=True)
+        has_lease = False
+
+    if has_lease and not _is_leader:
+        logger.info("Became scheduler leader %s", _token)
+    elif not has_lease and _is_leader:
+        logger.warning("Lost scheduler leadership %s", _token)
+    _is_leader = has_lease
+
+    # Состояние планировщика сверяется на каждом шаге, чтобы ошибка
+    # в resume/pause не оставила его в неверном состоянии
+    if has_lease:
+        if scheduler.state == STATE_PAUSED:
+            scheduler.resume()
+        else:
+            # задачи, добавленные в хранилище другими процессами,
+            # иначе не были бы замечены до следующего срабатывания таймера
+            scheduler.wakeup()
+    elif scheduler.state == STATE_RUNNING:
+        scheduler.pause()
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from redis.exceptions import RedisError
+
+import config
+from db.base import get_session
+from db.repository.product_price import ProductPriceRepository
+from logger import logger
+from utils.storage import redis_client
+
+
+def user_product_polling_key(user_product_id: int) -> str:
+    return f"polling:user_product:{user_product_id}"
+
+
+def popular_product_polling_key(popular_product_id: int) -> str:
+    return f"polling:popular:{popular_product_id}"
+
+
+def calculate_polling_interval(prices: list[int]) -> int:
+    """Интервал проверки в минутах по истории цен: чем чаще менялась цена,
+    тем ближе интервал к минимальному. Без истории проверяем как можно чаще"""
+    min_interval = config.POLLING_MIN_INTERVAL_MINUTES
+    max_interval = config.POLLING_MAX_INTERVAL_MINUTES
+
+    if len(prices) < config.POLLING_MIN_HISTORY_SIZE:
+        return min_interval
+
+    changes = sum(1 for prev, cur in zip(prices, prices[1:]) if prev != cur)
+    volatility = changes / (len(prices) - 1)
+
+    return round(max_interval - volatility * (max_interval - min_interval))
+
+
+async def is_check_due(key: str) -> bool:
+    try:
+        return not await redis_client.exists(key)
+    except RedisError:
+        logger.warning("Can't check polling key %s", key, exc_info=True)
+        return True
+
+
+async def get_next_check_interval(
+    product_id: int,
+    city: str | None,
+    min_interval: int,
+    price_changed: bool = False,
+) -> int:
+    """Через сколько минут проверить цену товара снова.
+
+    min_interval - не проверять чаще (интервал подписки пользователей).
+    С ADAPTIVE_POLLING интервал увеличивается по истории цен товара,
+    если только цена не изменилась при этой проверке"""
+    if not config.ADAPTIVE_POLLING or price_changed:
+        return min_interval
+
+    since = datetime.now() - timedelta(days=config.POLLING_HISTORY_DAYS)
+    async for session in get_session():
+        prices = await ProductPriceRepository(session).get_prices_since(
+            product_id, city if city else "МОСКВА", since
+        )
+
+    return max(min_interval, calculate_polling_interval(prices))
+
+
+async def schedule_next_check(
+    key: str,
+    product_id: int,
+    city: str | None,
+    base_interval: int,
+    price_changed: bool = False,
+):
+    """Откладывает следующую проверку задачи планировщика с периодом base_interval"""
+    interval = await get_next_check_interval(
+        product_id, city, base_interval, price_changed
+    )
+
+    # чаще проверять и так не получится, а реже - обеспечит сама задача
+    if interval <= base_interval:
+        return
+
+    try:
+        # чуть меньше интервала, чтобы ключ истёк к очередному запуску задачи
+        await redis_client.set(key, interval, ex=interval * 60 - 30)
+    except RedisError:
+        logger.warning("Can't set polling key %s", key, exc_info=True)
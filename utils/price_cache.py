@@ -0,0 +1,75 @@
+from redis.exceptions import RedisError
+
+import config
+from logger import logger
+from utils.storage import redis_client
+
+# Значение для товаров, цену которых не удалось распарсить (нет в наличии и т.п.)
+_NEGATIVE_VALUE = b"-"
+# Счётчики попаданий/промахов по маркетплейсам: HGETALL price_cache:stats
+STATS_KEY = "price_cache:stats"
+
+
+def _price_key(marker: str, short_link: str, zone: int | None) -> str:
+    return f"price:{marker}:{zone}:{short_link}"
+
+
+async def get_cached_prices(
+    marker: str, short_links: list[str], zone: int | None
+) -> dict[str, int | None]:
+    """Цены из кэша для тех товаров, которые в нём есть.
+    None - закэшированная неудача парсинга, повторно товар не запрашивается"""
+    if not short_links or config.PRICE_CACHE_TTL_SECONDS <= 0:
+        return {}
+
+    try:
+        values = await redis_client.mget(
+            [_price_key(marker, short_link, zone) for short_link in short_links]
+        )
+    except RedisError:
+        logger.warning("Can't get prices from cache", exc_info=True)
+        return {}
+
+    cached: dict[str, int | None] = {}
+    for short_link, value in zip(short_links, values):
+        if value is None:
+            continue
+
+        cached[short_link] = None if value == _NEGATIVE_VALUE else int(value)
+
+    await __count(marker, hits=len(cached), misses=len(short_links) - len(cached))
+    return cached
+
+
+async def cache_prices(marker: str, prices: dict[str, int | None], zone: int | None):
+    """Сохраняет цены в кэш, None сохраняется как неудача парсинга с коротким TTL"""
+    if not prices or config.PRICE_CACHE_TTL_SECONDS <= 0:
+        return
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for short_link, price in prices.items():
+                key = _price_key(marker, short_link, zone)
+                if price is None:
+                    pipe.set(
+                        key,
+                        _NEGATIVE_VALUE,
+                        ex=config.PRICE_CACHE_NEGATIVE_TTL_SECONDS,
+                    )
+                else:
+                    pipe.set(key, price, ex=config.PRICE_CACHE_TTL_SECONDS)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Can't save prices to cache", exc_info=True)
+
+
+async def __count(marker: str, hits: int, misses: int):
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if hits:
+                pipe.hincrby(STATS_KEY, f"{marker}:hits", hits)
+            if misses:
+                pipe.hincrby(STATS_KEY, f"{marker}:misses", misses)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Can't update price cache stats", exc_info=True)
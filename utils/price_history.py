@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+from redis.exceptions import RedisError
+from sqlalchemy import insert
+
+import config
+from db.base import ProductPrice, get_session
+from db.repository.product_price import ProductPriceRepository
+from logger import logger
+from utils.storage import redis_client
+
+# Цена товара в городе записывается в историю не чаще раза в 12 часов
+PRICE_HISTORY_INTERVAL = timedelta(hours=12)
+
+timezone = pytz.timezone("Europe/Moscow")
+
+_buffer: list[dict] = []
+_flush_lock = asyncio.Lock()
+_flush_task: asyncio.Task | None = None
+
+
+def is_price_history_due(last_price_time: datetime | None) -> bool:
+    if not last_price_time:
+        return True
+
+    check_date = datetime.now().astimezone(tz=timezone) - PRICE_HISTORY_INTERVAL
+    return last_price_time <= check_date
+
+
+def _last_seen_key(product_id: int, city: str) -> str:
+    return f"price_history:last:{product_id}:{city}"
+
+
+async def record_product_price(product_id: int, city: str | None, price: float):
+    """Добавляет цену в буфер истории цен, если за последние 12 часов
+    цена товара в этом городе ещё не записывалась.
+
+    Время последней записи хранится в Redis (ключ живёт 12 часов),
+    без Redis - проверяется запросом к БД"""
+    city = city if city else "МОСКВА"
+
+    try:
+        is_due = await redis_client.set(
+            _last_seen_key(product_id, city),
+            1,
+            nx=True,
+            ex=int(PRICE_HISTORY_INTERVAL.total_seconds()),
+        )
+    except RedisError:
+        logger.warning(
+            "Can't check last price of product %s", product_id, exc_info=True
+        )
+        async for session in get_session():
+            is_due = is_price_history_due(
+                await ProductPriceRepository(session).get_last_for_product_and_city(
+                    product_id, city
+                )
+            )
+
+    if not is_due:
+        return
+
+    _buffer.append(
+        {
+            "product_id": product_id,
+            "city": city,
+            "price": price,
+            "time_price": datetime.now(),
+        }
+    )
+    __ensure_flush_task()
+
+    if len(_buffer) >= config.PRICE_HISTORY_BATCH_SIZE:
+        await flush_product_prices()
+
+
+async def flush_product_prices():
+    """Записывает буфер истории цен одним INSERT. При ошибке записи
+    строки возвращаются в буфер до следующей попытки"""
+    global _buffer
+
+    async with _flush_lock:
+        if not _buffer:
+            return
+
+        rows, _buffer = _buffer, []
+        try:
+            async for session in get_session():
+                await session.execute(insert(ProductPrice).values(rows))
+                await session.commit()
+        except Exception:
+            logger.error("Can't write %s product prices", len(rows), exc_info=True)
+            pending = rows + _buffer
+            _buffer = pending[-config.PRICE_HISTORY_BATCH_SIZE * 10 :]
+            dropped = pending[: len(pending) - len(_buffer)]
+            if dropped:
+                logger.warning(
+                    "Dropped %s product prices from history buffer", len(dropped)
+                )
+                # снимаем отметки о записи отброшенных строк - иначе цены
+                # этих товаров не попадут в историю ближайшие 12 часов
+                await __release_last_seen(dropped)
+            return
+
+        logger.info("Written %s product prices", len(rows))
+
+
+async def close_price_history_writer():
+    global _flush_task
+
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+
+    await flush_product_prices()
+
+    if _buffer:
+        # строки, не записанные при остановке, будут потеряны
+        await __release_last_seen(_buffer)
+        _buffer.clear()
+
+
+async def __release_last_seen(rows: list[dict]):
+    try:
+        await redis_client.delete(
+            *{_last_seen_key(row["product_id"], row["city"]) for row in rows}
+        )
+    except RedisError:
+        logger.warning("Can't release last price keys", exc_info=True)
+
+
+def __ensure_flush_task():
+    global _flush_task
+
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(__flush_periodically())
+
+
+async def __flush_periodically():
+    while True:
+        await asyncio.sleep(config.PRICE_HISTORY_FLUSH_INTERVAL_SECONDS)
+        await flush_product_prices()
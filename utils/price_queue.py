@@ -0,0 +1,105 @@
+import time
+
+import config
+from utils.jitter import get_phase_seconds
+from utils.storage import redis_client
+
+# Очередь проверок цен в режиме PRICE_POLLING_MODE = "product":
+# sorted set, где элемент - пара (товар, зона доставки), а score - время
+# следующей проверки. Добавление, перенос и удаление пары - O(log n)
+PRICE_QUEUE_KEY = "price_checks:due"
+
+
+# Атомарно забирает до ARGV[2] пар, время проверки которых наступило,
+# и переносит их на ARGV[3] секунд вперёд (аренда). Если воркер не успеет
+# обработать пачку, пары снова станут доступны по истечении аренды
+_POP_DUE_SCRIPT = """
+local members = redis.call(
+    'ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2])
+)
+local lease_until = tonumber(ARGV[1]) + tonumber(ARGV[3])
+for _, member in ipairs(members) do
+    redis.call('ZADD', KEYS[1], lease_until, member)
+end
+return members
+"""
+
+_pop_due_script = redis_client.register_script(_POP_DUE_SCRIPT)
+
+
+def encode_price_check(marker: str, product_id: int, zone: int | None) -> str:
+    return f"{marker}:{product_id}:{zone}"
+
+
+def decode_price_check(member: str | bytes) -> tuple[str, int, int | None]:
+    if isinstance(member, bytes):
+        member = member.decode()
+
+    marker, product_id, zone = member.split(":")
+    return marker, int(product_id), None if zone == "None" else int(zone)
+
+
+async def add_price_checks(members: list[str], spread_seconds: int = 0):
+    """Добавляет пары в очередь с проверкой прямо сейчас или, со spread_seconds,
+    в течение этого времени по хэшу пары. Уже запланированные пары не переносятся"""
+    if not members:
+        return
+
+    now = time.time()
+    await redis_client.zadd(
+        PRICE_QUEUE_KEY,
+        {member: now + get_phase_seconds(member, spread_seconds) for member in members},
+        nx=True,
+    )
+
+
+async def schedule_price_checks(members: list[str], delay_seconds: float):
+    if not members:
+        return
+
+    score = time.time() + delay_seconds
+    await redis_client.zadd(PRICE_QUEUE_KEY, {member: score for member in members})
+
+
+async def remove_price_checks(members: list[str]):
+    if not members:
+        return
+
+    await redis_client.zrem(PRICE_QUEUE_KEY, *members)
+
+
+async def respread_price_checks(spread_seconds: int) -> int:
+    """Равномерно распределяет все проверки в очереди по spread_seconds от текущего
+    момента, например после простоя, когда время проверки наступило у всех сразу"""
+    now = time.time()
+    respread = 0
+    async for members in __scan_members():
+        await redis_client.zadd(
+            PRICE_QUEUE_KEY,
+            {
+                member: now + get_phase_seconds(member, spread_seconds)
+                for member in members
+            },
+            xx=True,
+        )
+        respread += len(members)
+
+    return respread
+
+
+async def __scan_members(count: int = 1000):
+    cursor = 0
+    while True:
+        cursor, items = await redis_client.zscan(PRICE_QUEUE_KEY, cursor, count=count)
+        if items:
+            yield [member.decode() for member, _ in items]
+        if cursor == 0:
+            return
+
+
+async def pop_due_price_checks(limit: int) -> list[str]:
+    members = await _pop_due_script(
+        keys=[PRICE_QUEUE_KEY],
+        args=[time.time(), limit, config.PRICE_CHECK_LEASE_SECONDS],
+    )
+    return [member.decode() for member in members]
@@ -2,26 +2,45 @@ import config
 from db.base import Product, Punkt
 
 from logger import logger
+from utils.exc import CircuitOpenError
+from utils.price_cache import cache_prices, get_cached_prices
 
 from services.ozon.ozon_api_service import OzonAPIService
 from services.wb.wb_api_service import WbAPIService
 
 
+def get_delivery_zone(marker: str, punkt: Punkt | None) -> int | None:
+    if marker == "ozon":
+        return punkt.ozon_zone if punkt else None
+
+    return punkt.wb_zone if punkt else config.WB_DEFAULT_DELIVERY_ZONE
+
+
 async def get_product_price(product: Product, punkt: Punkt | None) -> int | None:
-    if product.product_marker == "ozon":
-        return await get_ozon_product_price(product, punkt)
+    zone = get_delivery_zone(product.product_marker, punkt)
+    return await get_product_price_for_zone(product, zone)
 
-    return await get_wb_product_price(product, punkt)
 
+async def get_product_price_for_zone(product: Product, zone: int | None) -> int | None:
+    if product.product_marker == "ozon":
+        return await get_ozon_product_price(product, zone)
+
+    return await get_wb_product_price(product, zone)
 
-async def get_ozon_product_price(product: Product, punkt: Punkt | None) -> int | None:
-    zone = punkt.ozon_zone if punkt else None
 
+async def get_ozon_product_price(product: Product, zone: int | None) -> int | None:
     product.name = product.name if product.name else "Отсутствует"
+
+    cached = await get_cached_prices("ozon", [product.short_link], zone)
+    if product.short_link in cached:
+        return cached[product.short_link]
+
+    api_service = OzonAPIService()
     try:
-        api_service = OzonAPIService()
         res = await api_service.get_product_data(product.short_link, zone)
-        data = api_service.parse_product_data(res)
+    except CircuitOpenError:
+        logger.warning("ozon api is unavailable, skip product %s", product.id)
+        return None
     except Exception:
         logger.error(
             "Can't get product price for ozon product %s for zone %s",
@@ -31,16 +50,32 @@ async def get_ozon_product_price(product: Product, punkt: Punkt | None) -> int |
         )
         return None
 
-    return data.actual_price
+    try:
+        price = api_service.parse_product_data(res).actual_price
+    except Exception:
+        logger.error(
+            "Can't parse product price for ozon product %s for zone %s",
+            product.id,
+            zone,
+            exc_info=True,
+        )
+        price = None
+
+    await cache_prices("ozon", {product.short_link: price}, zone)
+    return price
 
 
-async def get_wb_product_price(product: Product, punkt: Punkt | None) -> int | None:
-    zone = punkt.wb_zone if punkt else config.WB_DEFAULT_DELIVERY_ZONE
+async def get_wb_product_price(product: Product, zone: int | None) -> int | None:
+    cached = await get_cached_prices("wb", [product.short_link], zone)
+    if product.short_link in cached:
+        return cached[product.short_link]
 
+    api_service = WbAPIService()
     try:
-        api_service = WbAPIService()
         res = await api_service.get_product_data(product.short_link, zone)
-        data = api_service.parse_product_data(res)
+    except CircuitOpenError:
+        logger.warning("wb api is unavailable, skip product %s", product.id)
+        return None
     except Exception:
         logger.error(
             "Can't get product price for wb product %s for zone %s",
@@ -50,4 +85,64 @@ async def get_wb_product_price(product: Product, punkt: Punkt | None) -> int | N
         )
         return None
 
-    return data.actual_price
+    try:
+        price = api_service.parse_product_data(res).actual_price
+    except Exception:
+        logger.error(
+            "Can't parse product price for wb product %s for zone %s",
+            product.id,
+            zone,
+            exc_info=True,
+        )
+        price = None
+
+    await cache_prices("wb", {product.short_link: price}, zone)
+    return price
+
+
+async def get_wb_products_prices(
+    products: list[Product], zone: int | None
+) -> dict[int, int]:
+    """Цены WB товаров одной зоны доставки, полученные пачками запросов.
+    В результат (product.id -> цена) попадают только товары с полученной ценой"""
+    products_by_short_link = {product.short_link: product for product in products}
+
+    prices = await get_cached_prices("wb", list(products_by_short_link), zone)
+    not_cached = [
+        short_link for short_link in products_by_short_link if short_link not in prices
+    ]
+
+    if not_cached:
+        try:
+            api_service = WbAPIService()
+            products_data = await api_service.get_products_data(not_cached, zone)
+        except CircuitOpenError:
+            logger.warning("wb api is unavailable, skip %s products", len(not_cached))
+            products_data = None
+        except Exception:
+            logger.error(
+                "Can't get products prices for %s wb products for zone %s",
+                len(not_cached),
+                zone,
+                exc_info=True,
+            )
+            products_data = None
+
+        if products_data is not None:
+            # товары, которых нет в ответе, не удалось распарсить
+            fetched = {
+                short_link: (
+                    products_data[short_link].actual_price
+                    if short_link in products_data
+                    else None
+                )
+                for short_link in not_cached
+            }
+            await cache_prices("wb", fetched, zone)
+            prices.update(fetched)
+
+    return {
+        products_by_short_link[short_link].id: price
+        for short_link, price in prices.items()
+        if price is not None
+    }
@@ -1,13 +1,16 @@
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime
 
 import aiofiles
 import pytz
 
 
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.exceptions import RedisError
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -21,7 +24,6 @@ from db.base import (
     get_session,
     UserProduct,
     UserProductJob,
-    ProductPrice,
 )
 from db.repository.apscheduler_job import ApschedulerJobRepository
 from db.repository.category import CategoryRepository
@@ -29,7 +31,6 @@ from db.repository.channel_link import ChannelLinkRepository
 from db.repository.popular_product import PopularProductRepository
 from db.repository.product import ProductRepository
 from db.repository.popular_product_sale_range import PopularProductSaleRangeRepository
-from db.repository.product_price import ProductPriceRepository
 from db.repository.punkt import PunktRepository
 from db.repository.user import UserRepository
 from db.repository.user_product import UserProductRepository
@@ -44,6 +45,14 @@ from utils.pics import ImageManager
 from utils.any import generate_sale_for_price, send_data_to_yandex_metica
 
 from utils.exc import OzonProductExistsError, WbProductExistsError
+from utils.jitter import get_spread_start_date
+from utils.prices import get_delivery_zone
+from utils.price_queue import (
+    add_price_checks,
+    encode_price_check,
+    remove_price_checks,
+)
+from utils.subscription import get_user_check_interval
 
 from config import JOB_STORE_URL
 from logger import logger
@@ -63,6 +72,9 @@ timezone = pytz.timezone("Europe/Moscow")
 scheduler_cron = IntervalTrigger(minutes=15, timezone=timezone)
 
 scheduler_interval = IntervalTrigger(hours=1, timezone=timezone)
+
+POPULAR_PRODUCT_CHECK_INTERVAL_MINUTES = 120
+RESPREAD_JOBS_PAGE_SIZE = 500
 image_manager = ImageManager(bot)
 
 
@@ -166,10 +178,10 @@ async def add_product_to_db_popular_product(
     job_id = f"popular_{popular_product.id}"
     job = scheduler.add_job(
         func=background_task_wrapper,
-        trigger="interval",
-        hours=2,
+        trigger=spread_interval_trigger(job_id, POPULAR_PRODUCT_CHECK_INTERVAL_MINUTES),
         id=job_id,
         coalesce=True,
+        misfire_grace_time=config.JOB_MISFIRE_GRACE_SECONDS,
         args=(
             "push_check_popular_product",
             popular_product.id,
@@ -223,20 +235,29 @@ async def add_product_to_db(
 
         job_id = f"{user_id}:{marker}:{user_product_id}"
 
-        _ = scheduler.add_job(
-            background_task_wrapper,
-            trigger="interval",
-            minutes=15,
-            id=job_id,
-            jobstore="sqlalchemy",
-            coalesce=True,
-            args=(
-                "push_check_price",
+        if config.PRICE_POLLING_MODE != "product":
+            add_user_product_job(
+                scheduler,
+                job_id,
                 user_id,
                 user_product_id,
-            ),
-            kwargs={"_queue_name": "arq:low"},
-        )
+                await get_user_check_interval(user_id, session),
+            )
+        else:
+            punkt = await PunktRepository(session).get_users_punkt(user_id)
+            try:
+                await add_price_checks(
+                    [
+                        encode_price_check(
+                            marker, product.id, get_delivery_zone(marker, punkt)
+                        )
+                    ]
+                )
+            except RedisError:
+                # товар уже сохранён, в очередь его добавит сверка очереди с БД
+                logger.warning(
+                    "Can't add product %s to price queue", product.id, exc_info=True
+                )
 
         user_job = UserProductJob(user_product_id=user_product_id, job_id=job_id)
         await user_product_job_repo.create(user_job)
@@ -252,6 +273,76 @@ async def add_product_to_db(
                 await send_data_to_yandex_metica(utm.client_id, goal_id="add_product")
 
 
+def add_user_product_job(
+    scheduler: AsyncIOScheduler,
+    job_id: str,
+    user_id: int,
+    user_product_id: int,
+    interval_minutes: int,
+):
+    scheduler.add_job(
+        background_task_wrapper,
+        trigger=spread_interval_trigger(job_id, interval_minutes),
+        id=job_id,
+        jobstore="sqlalchemy",
+        coalesce=True,
+        misfire_grace_time=config.JOB_MISFIRE_GRACE_SECONDS,
+        args=(
+            "push_check_price",
+            user_id,
+            user_product_id,
+        ),
+        kwargs={"_queue_name": "arq:low"},
+        replace_existing=True,
+    )
+
+
+async def restore_user_product_jobs(scheduler: AsyncIOScheduler):
+    """Пересоздаёт задачи проверки цен товаров пользователей, которых нет
+    в планировщике, например после работы в режиме проверки по товарам.
+    Задачи неактивных пользователей приостановит push_check_price"""
+    if config.PRICE_POLLING_MODE == "product":
+        return
+
+    async for session in get_session():
+        user_product_job_repo = UserProductJobRepository(session)
+        missing_jobs = await user_product_job_repo.get_missing_scheduler_jobs()
+
+        intervals: dict[int, int] = {}
+        for job_id, user_id, user_product_id in missing_jobs:
+            if user_id not in intervals:
+                intervals[user_id] = await get_user_check_interval(user_id, session)
+
+            add_user_product_job(
+                scheduler, job_id, user_id, user_product_id, intervals[user_id]
+            )
+
+    logger.info("Restored %s user product jobs", len(missing_jobs))
+
+
+async def remove_unused_price_check(
+    product_id: int, marker: str, user_id: int, session: AsyncSession
+):
+    """Убирает пару (товар, зона) из очереди проверок, если после удаления
+    товара пользователем её больше никто не отслеживает"""
+    if config.PRICE_POLLING_MODE != "product":
+        return
+
+    punkt = await PunktRepository(session).get_users_punkt(user_id)
+    zone = get_delivery_zone(marker, punkt)
+    if await UserProductRepository(session).has_product_subscribers(
+        product_id, zone, config.WB_DEFAULT_DELIVERY_ZONE
+    ):
+        return
+
+    try:
+        await remove_price_checks([encode_price_check(marker, product_id, zone)])
+    except RedisError:
+        logger.warning(
+            "Can't remove product %s from price queue", product_id, exc_info=True
+        )
+
+
 async def try_update_ozon_product_photo(
     product_id: int, short_link: str, session: AsyncSession
 ):
@@ -665,10 +756,12 @@ async def sync_popular_product_jobs(scheduler: AsyncIOScheduler):
             job_id = f"popular_{pp_id}"
             scheduler.add_job(
                 func=background_task_wrapper,
-                trigger="interval",
-                hours=2,
+                trigger=spread_interval_trigger(
+                    job_id, POPULAR_PRODUCT_CHECK_INTERVAL_MINUTES
+                ),
                 id=job_id,
                 coalesce=True,
+                misfire_grace_time=config.JOB_MISFIRE_GRACE_SECONDS,
                 args=(
                     "push_check_popular_product",
                     pp_id,
@@ -723,41 +816,192 @@ async def setup_messages_sendigns_job(scheduler: AsyncIOScheduler):
     )
 
 
-async def try_add_product_price_to_db(product_id: int, city: str | None, price: float):
+async def setup_product_price_checks_job(scheduler: AsyncIOScheduler):
+    reconcile_job_id = "product_price_checks"
+    sweep_job_id = "product_price_sweep"
 
-    city = city if city else "МОСКВА"
+    if config.PRICE_POLLING_MODE != "product":
+        remove_job_if_exists(scheduler, reconcile_job_id)
+        remove_job_if_exists(scheduler, sweep_job_id)
+        return
 
-    async for session in get_session():
-        async with session as _session:
-            pp_repo = ProductPriceRepository(_session)
-            first_element_date = await pp_repo.get_last_for_product_and_city(
-                product_id, city
-            )
+    logger.info("Setup product price checks jobs")
 
-            if first_element_date:
-                print("first_element_date", first_element_date)
-                check_date = datetime.now().astimezone(tz=timezone) - timedelta(
-                    hours=12
-                )
+    scheduler.add_job(
+        func=background_task_wrapper,
+        trigger=IntervalTrigger(minutes=config.PRICE_QUEUE_RECONCILE_INTERVAL_MINUTES),
+        id=reconcile_job_id,
+        coalesce=True,
+        args=("reconcile_price_queue",),
+        kwargs={"_queue_name": "arq:low"},  # _queue_name
+        jobstore="sqlalchemy",
+        replace_existing=True,
+        # сразу заполняем очередь, например после смены режима
+        next_run_time=datetime.now(),
+    )
+
+    scheduler.add_job(
+        func=background_task_wrapper,
+        trigger=IntervalTrigger(seconds=config.PRICE_CHECK_SWEEP_INTERVAL_SECONDS),
+        id=sweep_job_id,
+        coalesce=True,
+        args=("sweep_due_price_checks",),
+        kwargs={"_queue_name": "arq:low"},  # _queue_name
+        jobstore="sqlalchemy",
+        replace_existing=True,
+    )
 
-                if first_element_date > check_date:
-                    print("Too early")
-                    return
 
-            product_price = ProductPrice(
-                product_id=product_id,
-                city=city,
-                price=price,
-                time_price=datetime.now(),
+def spread_interval_trigger(job_id: str, minutes: int) -> IntervalTrigger:
+    """Интервальный триггер со смещением по хэшу id задачи, чтобы задачи,
+    созданные одновременно (массовый импорт, перезапуск), не срабатывали разом"""
+    return IntervalTrigger(
+        minutes=minutes,
+        start_date=get_spread_start_date(job_id, minutes * 60),
+        timezone=timezone,
+    )
+
+
+async def respread_jobs(scheduler: AsyncIOScheduler) -> int:
+    """Перераспределяет уже созданные задачи проверки цен по их периодам.
+
+    Задачи обрабатываются страницами по id, синхронные вызовы хранилища
+    задач выполняются вне event loop"""
+    respread = 0
+    after = None
+    while True:
+        async for session in get_session():
+            job_ids = await ApschedulerJobRepository(session).get_job_ids_page(
+                after, RESPREAD_JOBS_PAGE_SIZE
             )
+        if not job_ids:
+            break
+
+        after = job_ids[-1]
+        respread += await asyncio.to_thread(__respread_jobs_page, scheduler, job_ids)
+
+    logger.info("Respread %s scheduler jobs", respread)
+    return respread
+
+
+def __respread_jobs_page(scheduler: AsyncIOScheduler, job_ids: list[str]) -> int:
+    respread = 0
+    now = datetime.now(scheduler.timezone)
+    for job_id in job_ids:
+        is_price_job = ":ozon:" in job_id or ":wb:" in job_id
+        if not (is_price_job or job_id.startswith("popular_")):
+            continue
+
+        job = scheduler.get_job(job_id, jobstore="sqlalchemy")
+        if job is None or not isinstance(job.trigger, IntervalTrigger):
+            continue
+
+        minutes = int(job.trigger.interval.total_seconds() // 60)
+        trigger = spread_interval_trigger(job_id, minutes)
+        changes = {
+            "trigger": trigger,
+            "misfire_grace_time": config.JOB_MISFIRE_GRACE_SECONDS,
+        }
+        if job.next_run_time is not None:
+            # приостановленные задачи (неактивные пользователи) остаются
+            # приостановленными
+            changes["next_run_time"] = trigger.get_next_fire_time(None, now)
+
+        try:
+            scheduler.modify_job(job_id, jobstore="sqlalchemy", **changes)
+        except JobLookupError:
+            continue
+        respread += 1
+
+    return respread
+
+
+def remove_job_if_exists(scheduler: AsyncIOScheduler, job_id: str):
+    """Удаляет задачу из планировщика. В режиме проверки цен по товарам
+    у товаров пользователей может не быть собственных задач"""
+    try:
+        scheduler.remove_job(job_id=job_id, jobstore="sqlalchemy")
+    except JobLookupError:
+        logger.info("Job %s not found in scheduler", job_id)
 
-            await pp_repo.create(product_price)
 
+async def save_price_check_results(user_product_updates: dict[int, dict]):
+    """Сохраняет изменения товаров пользователей (actual_price, last_send_price)
+    после проверки цены одной транзакцией"""
+    if not user_product_updates:
+        return
 
-async def update_last_send_price_by_user_product(
-    last_send_price: float, user_product_id: int
-):
     async for session in get_session():
-        async with session as _session:
-            repo = UserProductRepository(_session)
-            await repo.update_old(user_product_id, last_send_price=last_send_price)
+        async with session.begin():
+            await UserProductRepository(session).update_many(user_product_updates)
+
+
+async def reschedule_user_product_jobs(
+    scheduler: AsyncIOScheduler, user_id: int, session: AsyncSession
+):
+    """Переносит задачи проверки цен товаров пользователя
+    на интервал его текущей подписки"""
+    if config.PRICE_POLLING_MODE == "product":
+        # интервал подписки учитывается при проверке пары (товар, зона)
+        return
+
+    interval = await get_user_check_interval(user_id, session)
+    job_ids = await UserProductJobRepository(session).get_user_job_ids(user_id)
+    logger.info(
+        "Rescheduling %s jobs of user %s to %s minutes",
+        len(job_ids),
+        user_id,
+        interval,
+    )
+
+    for job_id in job_ids:
+        job = scheduler.get_job(job_id, jobstore="sqlalchemy")
+        if job is None:
+            logger.warning("Job %s was not found", job_id)
+            continue
+
+        trigger = spread_interval_trigger(job_id, interval)
+        try:
+            if job.next_run_time is None:
+                # задача приостановлена (пользователь неактивен): reschedule_job
+                # запустил бы её снова, меняем только триггер
+                job.modify(trigger=trigger)
+            else:
+                job.reschedule(trigger)
+        except JobLookupError:
+            logger.warning("Job %s was not found", job_id)
+
+
+async def pause_user_product_jobs(
+    scheduler: AsyncIOScheduler, user_id: int, session: AsyncSession
+):
+    """Приостанавливает проверку цен товаров неактивного пользователя"""
+    if config.PRICE_POLLING_MODE == "product":
+        # у товаров пользователей нет собственных задач
+        return
+
+    job_ids = await UserProductJobRepository(session).get_user_job_ids(user_id)
+    logger.info("Pausing %s jobs of inactive user %s", len(job_ids), user_id)
+
+    for job_id in job_ids:
+        try:
+            scheduler.pause_job(job_id, jobstore="sqlalchemy")
+        except JobLookupError:
+            logger.warning("Job %s was not found", job_id)
+
+
+async def resume_user_product_jobs(
+    scheduler: AsyncIOScheduler, user_id: int, session: AsyncSession
+):
+    if config.PRICE_POLLING_MODE == "product":
+        # у товаров пользователей нет собственных задач
+        return
+
+    job_ids = await UserProductJobRepository(session).get_user_job_ids(user_id)
+    logger.info("Resuming %s jobs of user %s", len(job_ids), user_id)
+
+    for job_id in job_ids:
+        try:
+            scheduler.resume_job(job_id, jobstore="sqlalchemy")
+        except JobLookupError:
+            logger.warning("Job %s was not found", job_id)
@@ -6,6 +6,8 @@ from db.repository.user import UserRepository
 from db.repository.user_product import UserProductRepository
 from utils.exc import Forbidden
 
+DEFAULT_CHECK_INTERVAL_MINUTES = 15
+
 
 async def get_user_subscription_option(
     session: AsyncSession, user_id: int
@@ -38,3 +40,13 @@ async def get_user_subscription_limit(
         len(products["ozon"]),
         len(products["wb"]),
     )
+
+
+async def get_user_check_interval(user_id: int, session: AsyncSession) -> int:
+    """Returns how often user products prices should be checked, in minutes"""
+    try:
+        subscription = await get_user_subscription_option(session, user_id)
+    except Forbidden:
+        return DEFAULT_CHECK_INTERVAL_MINUTES
+
+    return subscription.check_interval_minutes
@@ -0,0 +1,79 @@
+import asyncio
+from collections import deque
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+
+from logger import logger
+
+
+class UpdateDispatcher:
+    """Обрабатывает апдейты Telegram в фоне, чтобы webhook отвечал сразу.
+
+    Одновременно обрабатывается не больше `concurrency` апдейтов. Апдейты
+    одного чата обрабатываются по порядку, разных чатов - параллельно"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, concurrency: int):
+        self.dp = dp
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # апдейты, ожидающие обработки, по чатам. Первый в очереди - обрабатываемый
+        self._chats: dict[int, deque[types.Update]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, update: types.Update):
+        chat_id = self._get_chat_id(update)
+
+        if chat_id is None:
+            self._start(self._process(update))
+            return
+
+        if chat_id in self._chats:
+            self._chats[chat_id].append(update)
+            return
+
+        self._chats[chat_id] = deque([update])
+        self._start(self._process_chat(chat_id))
+
+    async def close(self, timeout: float):
+        """Ждёт обработки принятых апдейтов, оставшиеся по таймауту отменяет"""
+        if not self._tasks:
+            return
+
+        logger.info("Waiting for %s update tasks", len(self._tasks))
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        if pending:
+            logger.warning("Cancelled %s update tasks on shutdown", len(pending))
+
+    def _start(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_chat(self, chat_id: int):
+        queue = self._chats[chat_id]
+        try:
+            while queue:
+                await self._process(queue[0])
+                queue.popleft()
+        finally:
+            del self._chats[chat_id]
+
+    async def _process(self, update: types.Update):
+        async with self._semaphore:
+            try:
+                await self.dp.feed_update(bot=self.bot, update=update)
+            except Exception:
+                logger.exception("Error in processing update %s", update.update_id)
+
+    @staticmethod
+    def _get_chat_id(update: types.Update) -> int | None:
+        context = UserContextMiddleware.resolve_event_context(update)
+        if context.chat:
+            return context.chat.id
+        if context.user:
+            return context.user.id
+        return None
@@ -0,0 +1,75 @@
+from redis.exceptions import RedisError
+
+import config
+from logger import logger
+from utils.storage import redis_client
+
+# Счётчики попаданий/промахов: HGETALL user_cache:stats
+STATS_KEY = "user_cache:stats"
+# Счётчики копятся в процессе и сбрасываются в Redis раз в столько проверок
+_STATS_FLUSH_EVERY = 100
+
+_stats = {"hits": 0, "misses": 0}
+
+
+def _user_key(user_id: int) -> str:
+    return f"user:active:{user_id}"
+
+
+async def is_known_active(user_id: int) -> bool:
+    """Известно ли, что пользователь есть в БД и активен"""
+    if config.USER_CACHE_TTL_SECONDS <= 0:
+        return False
+
+    try:
+        is_active = bool(await redis_client.exists(_user_key(user_id)))
+    except RedisError:
+        logger.warning("Can't get user %s from cache", user_id, exc_info=True)
+        is_active = False
+
+    await __count("hits" if is_active else "misses")
+    return is_active
+
+
+async def remember_active(user_id: int):
+    if config.USER_CACHE_TTL_SECONDS <= 0:
+        return
+
+    try:
+        await redis_client.set(_user_key(user_id), 1, ex=config.USER_CACHE_TTL_SECONDS)
+    except RedisError:
+        logger.warning("Can't save user %s to cache", user_id, exc_info=True)
+
+
+async def forget_users(user_ids: list[int]):
+    """Вызывается, когда пользователи помечаются неактивными.
+
+    Флаг хранится только в Redis, а не в памяти процессов: пользователей
+    помечают неактивными другие процессы (отправитель уведомлений, рассылки),
+    и локальный кэш бота они очистить не могут - вернувшийся пользователь
+    остался бы неактивным до истечения его TTL"""
+    if not user_ids:
+        return
+
+    try:
+        await redis_client.delete(*(_user_key(user_id) for user_id in user_ids))
+    except RedisError:
+        logger.warning("Can't remove users from cache", exc_info=True)
+
+
+async def __count(field: str):
+    _stats[field] += 1
+    if sum(_stats.values()) < _STATS_FLUSH_EVERY:
+        return
+
+    counts = {field: count for field, count in _stats.items() if count}
+    for field in _stats:
+        _stats[field] = 0
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for field, count in counts.items():
+                pipe.hincrby(STATS_KEY, field, count)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("Can't update user cache stats", exc_info=True)